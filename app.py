@@ -2,17 +2,59 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import csv
+import gzip
+import hashlib
+import io
+import json
 import logging
+import os
 from logging import Formatter, FileHandler
+import random
 import sys
+import threading
+import time
+from urllib.parse import urlencode
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache, wraps
+from itertools import chain, groupby, islice
+
+from datetime import datetime, timedelta, timezone
 
 import babel
+import click
 import dateutil.parser
-from flask import Flask, render_template, request, flash, redirect, url_for, jsonify
+from flask import Blueprint, Flask, render_template, stream_template, stream_with_context, request, flash, redirect, url_for, jsonify, abort, session, make_response, g, has_request_context
 from flask_moment import Moment
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.pool import Pool, QueuePool
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import is_resource_modified
 from forms import *
+from assets import Assets
+from cache import TaggedCache, make_backend
+from instrumentation import SQLInstrumentation
+from templating import TemplateInstrumentation
+from pagination import encode_cursor, keyset_page
+from replicas import ReplicaSet, RoutingSession
+from search import TrigramIndex, contains_pattern, search_text
+
+# optional: faster JSON encoding and brotli compression for the API
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -21,8 +63,73 @@ from forms import *
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+
+
+def engine_options(config, url=None):
+    """Engine options from the DB_* settings, for Postgres (SQLite keeps the defaults)."""
+    url = make_url(url or config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'postgresql':
+        return {}
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'connect_args': {},
+    }
+    # psycopg2 never prepares statements server-side; psycopg 3 does unless told not to
+    if config['DB_PGBOUNCER'] and url.get_driver_name() == 'psycopg':
+        options['connect_args']['prepare_threshold'] = None
+    return options
+
+
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+# replicas are extra binds; RoutingSession sends a request's reads to the one replica_reads picked
+replica_set = ReplicaSet(['replica_{}'.format(number) for number in range(len(app.config['SQLALCHEMY_REPLICA_URIS']))],
+                         retry_seconds=app.config['REPLICA_RETRY_SECONDS'])
+# each replica gets the primary's pool settings (engine_options for its own URL)
+for key, url in zip(replica_set.keys, app.config['SQLALCHEMY_REPLICA_URIS']):
+    app.config.setdefault('SQLALCHEMY_BINDS', {})[key] = dict(engine_options(app.config, url), url=url)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
 migrate = Migrate(app,db)
+sql_instrumentation = SQLInstrumentation(app)
+template_instrumentation = TemplateInstrumentation(app)
+assets = Assets(app)
+
+# connections opened and checked out by this worker's pools, for /healthz
+pool_counters = {'connects': 0, 'checkouts': 0}
+pool_counters_lock = threading.Lock()
+
+
+@db.event.listens_for(Pool, 'connect')
+def count_connect(dbapi_connection, connection_record):
+    with pool_counters_lock:
+        pool_counters['connects'] += 1
+
+
+@db.event.listens_for(Pool, 'checkout')
+def count_checkout(dbapi_connection, connection_record, connection_proxy):
+    with pool_counters_lock:
+        pool_counters['checkouts'] += 1
+
+
+# DB_STATEMENT_TIMEOUT as the first statement of each transaction a web request runs, on the request's
+# thread or its query pool tasks; CLI commands and migrations (rollover, seed, backfills) stay unbounded
+def set_statement_timeout(connection):
+    if connection.dialect.name == 'postgresql' and (has_request_context() or g.get('request_task')):
+        # on the DBAPI cursor: the Connection is still inside begin() here
+        cursor = connection.connection.cursor()
+        cursor.execute('SET LOCAL statement_timeout = {:d}'.format(app.config['DB_STATEMENT_TIMEOUT']))
+        cursor.close()
+
+
+if app.config['DB_STATEMENT_TIMEOUT']:
+    # SET LOCAL rather than a connection startup option: it ends with the transaction, so it neither
+    # leaks into CLI work on the same pool nor trips PgBouncer, which rejects startup options
+    with app.app_context():
+        for engine in db.engines.values():
+            db.event.listen(engine, 'begin', set_statement_timeout)
 
 
 #----------------------------------------------------------------------------#
@@ -30,13 +137,24 @@ migrate = Migrate(app,db)
 #----------------------------------------------------------------------------#
 
 
+# Postgres stores genres as a real ARRAY; SQLite (tests) falls back to a JSON list
+GenreList = postgresql.ARRAY(db.String(120)).with_variant(db.JSON(), 'sqlite')
+
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_Venue_search_text_trgm', 'search_text',
+                 postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_updated_at', 'updated_at'),
+        db.Index('ix_Venue_next_show_at', 'next_show_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     website = db.Column(db.String)
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(GenreList)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
@@ -45,11 +163,35 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String)
+    # lower-cased name, city, state and genres, trigram-indexed for search
+    search_text = db.Column(db.Text)
     shows = db.relationship('Show', backref='venue', lazy=True)
+    # show counters read by the listing and search pages: kept up to date by the Show events below
+    # and moved from upcoming to past as shows start by "flask rollover"
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime)
+    # last change and a version counter bumped by every UPDATE (see bump_version); the page validators use both
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+                           server_default=db.func.now())
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+
+# the venues listing's keyset: by area, most upcoming shows first within a city, then id;
+# the count is negated so the whole key sorts ascending and compares as one row value
+VENUE_LISTING_ORDER = [Venue.state, Venue.city, -Venue.upcoming_shows_count, Venue.id]
+db.Index('ix_Venue_listing', *VENUE_LISTING_ORDER)
 
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_Artist_search_text_trgm', 'search_text',
+                 postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+        db.Index('ix_Artist_updated_at', 'updated_at'),
+        db.Index('ix_Artist_next_show_at', 'next_show_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -57,21 +199,184 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = db.Column(GenreList)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String)
+    # lower-cased name, city, state and genres, trigram-indexed for search
+    search_text = db.Column(db.Text)
     shows = db.relationship('Show', backref='artist', lazy=True)
+    # show counters, as on Venue
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime)
+    # last change and version counter, as on Venue
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+                           server_default=db.func.now())
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    # every venue/artist page filters on its foreign key plus start_time >= now (or < now)
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time', 'start_time'),
+        db.Index('ix_Show_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
+    # active history: moving a show must recount its old venue or artist (recount_moved_show),
+    # even when the old id was never loaded before it was reassigned
+    venue_id = db.column_property(db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False),
+                                  active_history=True)
+    artist_id = db.column_property(db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False),
+                                   active_history=True)
     start_time = db.Column(db.DateTime, nullable=False)
+    # last change and version counter, as on Venue
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+                           server_default=db.func.now())
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+
+class ChangeCounter(db.Model):
+    # monotonic change counters for pages built from whole tables (the shows listing's validators);
+    # bumped in the transaction of each change, so deletions count too
+    __tablename__ = 'ChangeCounter'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.now, server_default=db.func.now())
+
+
+@db.event.listens_for(Venue, 'before_insert')
+@db.event.listens_for(Venue, 'before_update')
+@db.event.listens_for(Artist, 'before_insert')
+@db.event.listens_for(Artist, 'before_update')
+def update_search_text(mapper, connection, target):
+    target.search_text = search_text(target.name, target.city, target.state, genres=target.genres)
+
+
+@db.event.listens_for(Venue, 'before_update')
+@db.event.listens_for(Artist, 'before_update')
+@db.event.listens_for(Show, 'before_update')
+def bump_version(mapper, connection, target):
+    # version + 1 in SQL rather than an ORM version_id_col: the show events bump venue and artist versions
+    # with Core UPDATEs, which must not make a concurrent edit of the row fail as stale
+    if db.inspect(target).session.is_modified(target, include_collections=False):
+        target.version = mapper.class_.version + 1
+
+
+@db.event.listens_for(Venue, 'after_insert')
+@db.event.listens_for(Venue, 'after_update')
+@db.event.listens_for(Venue, 'after_delete')
+@db.event.listens_for(Artist, 'after_insert')
+@db.event.listens_for(Artist, 'after_update')
+@db.event.listens_for(Artist, 'after_delete')
+def invalidate_search_index(mapper, connection, target):
+    # the in-process fallback index is rebuilt from the table on the next search
+    search_indexes.pop(mapper.class_, None)
+
+
+# the Show column pointing at each model with show counters
+COUNTED_BY = {Venue: Show.venue_id, Artist: Show.artist_id}
+
+
+def show_counter_values(model, now):
+    # SET clause recomputing a venue's or artist's show counters from Show as of `now`
+    table = model.__table__
+    show_fk = COUNTED_BY[model]
+    shows = db.select(db.func.count(Show.id)).where(show_fk == table.c.id)
+    return {
+        'upcoming_shows_count': shows.where(Show.start_time >= now).scalar_subquery(),
+        'past_shows_count': shows.where(Show.start_time < now).scalar_subquery(),
+        'next_show_at': db.select(db.func.min(Show.start_time)).
+            where(show_fk == table.c.id, Show.start_time >= now).
+            scalar_subquery(),
+        # the venue's or artist's page changes with its shows: new ETag and Last-Modified
+        **touched(table),
+    }
+
+
+def touched(table):
+    # SET values marking venue or artist rows as changed for the page validators
+    return {'version': table.c.version + 1, 'updated_at': datetime.now()}
+
+
+def bump_change_counter(connection, name):
+    # one more change to `name` (see ChangeCounter); the row is created on first use
+    table = ChangeCounter.__table__
+    now = datetime.now()
+    result = connection.execute(table.update().where(table.c.name == name).
+                                values(version=table.c.version + 1, changed_at=now))
+    if not result.rowcount:
+        connection.execute(table.insert().values(name=name, version=1, changed_at=now))
+
+
+def recount_shows(model, ids, connection=None, now=None, batch_size=1000):
+    # recompute the show counters of these venues or artists, in the current transaction
+    ids = sorted(ids)
+    table = model.__table__
+    values = show_counter_values(model, now or datetime.now())
+    for start in range(0, len(ids), batch_size):
+        (connection or db.session).execute(
+            table.update().where(table.c.id.in_(ids[start:start + batch_size])).values(values))
+
+
+@db.event.listens_for(Show, 'after_insert')
+def count_new_show(mapper, connection, target):
+    # one more upcoming or past show for its venue and artist; the increments are atomic,
+    # so concurrent inserts for the same venue do not lose counts
+    upcoming = target.start_time >= datetime.now()
+    for model, entity_id in ((Venue, target.venue_id), (Artist, target.artist_id)):
+        table = model.__table__
+        if upcoming:
+            values = {
+                'upcoming_shows_count': table.c.upcoming_shows_count + 1,
+                'next_show_at': db.case((db.or_(table.c.next_show_at.is_(None),
+                                                table.c.next_show_at > target.start_time), target.start_time),
+                                        else_=table.c.next_show_at),
+            }
+        else:
+            values = {'past_shows_count': table.c.past_shows_count + 1}
+        connection.execute(table.update().where(table.c.id == entity_id).values(**touched(table), **values))
+    bump_change_counter(connection, 'shows')
+
+
+@db.event.listens_for(Show, 'after_delete')
+def recount_deleted_show(mapper, connection, target):
+    # whether the show was still counted as upcoming depends on the last rollover, so recount rather than decrement
+    recount_shows(Venue, [target.venue_id], connection)
+    recount_shows(Artist, [target.artist_id], connection)
+    bump_change_counter(connection, 'shows')
+
+
+@db.event.listens_for(Show, 'after_update')
+def recount_moved_show(mapper, connection, target):
+    # a show moved to another time, venue or artist: recount the old and the new side
+    state = db.inspect(target)
+    moved = state.attrs.start_time.history.has_changes()
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+        history = state.attrs[key].history
+        if moved or history.has_changes():
+            recount_shows(model, {getattr(target, key), *history.deleted}, connection)
+    bump_change_counter(connection, 'shows')
+
+
+@db.event.listens_for(Venue, 'after_update')
+@db.event.listens_for(Artist, 'after_update')
+def touch_counterparts(mapper, connection, target):
+    # a new name or picture shows on the pages of the other side of its shows and on the shows listing
+    state = db.inspect(target)
+    if not any(state.attrs[key].history.has_changes() for key in ('name', 'image_link')):
+        return
+    counterpart = Artist if mapper.class_ is Venue else Venue
+    table = counterpart.__table__
+    counterpart_ids = db.select(COUNTED_BY[counterpart]).where(COUNTED_BY[mapper.class_] == target.id)
+    connection.execute(table.update().where(table.c.id.in_(counterpart_ids)).values(**touched(table)))
+    bump_change_counter(connection, 'shows')
 
 
 
@@ -80,16 +385,501 @@ class Show(db.Model):
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+    # babel pattern compiled once per (format, locale)
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+
+@lru_cache(maxsize=4096)
+def format_datetime_cached(value, format, locale):
+    # listings repeat the same start times a lot (weekly residencies, festival slots)
+    pattern, locale = datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format='medium', locale='en'):
+  # accepts datetime objects as they come from the DB; strings are still parsed for old callers
+  if not isinstance(value, datetime):
+      value = dateutil.parser.parse(value)
+  return format_datetime_cached(value, format, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+
+@app.template_global()
+def page_url(cursor):
+    # link to another page of the current listing, keeping the other query params (e.g. limit)
+    args = request.args.to_dict(flat=False)
+    args['cursor'] = cursor
+    return url_for(request.endpoint, **dict(request.view_args or {}, **args))
+
+
+def page_limit():
+    # ?limit= for listing pages, bounded so a single page stays cheap
+    limit = request.args.get('limit', app.config['PAGE_SIZE'], type=int)
+    return max(1, min(limit, app.config['MAX_PAGE_SIZE']))
+
+
+def paginate(query, columns, key, descending=False):
+    # keyset page for the current request's ?cursor= / ?limit=, 400 on a malformed cursor
+    try:
+        return keyset_page(query, columns, key, cursor=request.args.get('cursor'),
+                           limit=page_limit(), descending=descending)
+    except ValueError:
+        abort(400)
+
+
+def streaming():
+    # ?stream=1 on a listing page: every row in one streamed response instead of a page
+    return request.args.get('stream') == '1'
+
+
+def stream_listing(template, name, query, **context):
+    """Stream `template` rendered over all rows of `query`, bound to `name`.
+
+    Rows are fetched STREAM_YIELD_PER at a time (a server-side cursor on Postgres)
+    while Jinja renders them, and the HTML is sent in chunks of about
+    STREAM_CHUNK_SIZE characters, so neither the rows nor the page are ever held
+    in memory as a whole and the first bytes leave before the last rows are read.
+    """
+    context[name] = query.yield_per(app.config['STREAM_YIELD_PER'])
+    chunks = stream_template(template, **context)
+    return app.response_class(buffered_chunks(chunks, app.config['STREAM_CHUNK_SIZE']), mimetype='text/html')
+
+
+def buffered_chunks(chunks, size):
+    # Jinja yields a chunk per template fragment; join them into fewer, larger writes
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# threads running a request's independent read queries side by side (each on its own pooled connection);
+# threads start on first use, so a --preload master forks before any exist
+query_pool = ThreadPoolExecutor(max_workers=max(app.config['DETAIL_QUERY_WORKERS'], 1), thread_name_prefix='query')
+
+
+def in_query_context(call, replica, sql_stats):
+    # a query pool task: its own app context and session, on the request's replica, counted in its stats
+    with app.app_context():
+        g.replica = replica
+        g.sql_stats = sql_stats
+        g.request_task = True
+        return call()
+
+
+def free_connections(engine):
+    # connections the engine's pool can still hand out without waiting, None when it does not limit them
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return None
+    return pool.size() + app.config['DB_MAX_OVERFLOW'] - pool.checkedout()
+
+
+def concurrently(*calls):
+    """Run independent read-only calls at the same time and return their results in order.
+
+    The first call runs in the current thread on the request's session; the others
+    run on query_pool, each with its own session, so they must only read and must
+    not return ORM instances (they are detached when their session closes). Each of
+    those needs a connection of its own on top of the request's, so when the pool
+    has no room for them (busy request threads already hold its connections) or
+    DETAIL_QUERY_WORKERS = 0 the calls simply run one after another instead of
+    waiting up to DB_POOL_TIMEOUT for a connection.
+    """
+    free = free_connections(db.session.get_bind())
+    if not app.config['DETAIL_QUERY_WORKERS'] or (free is not None and free <= len(calls) - 1):
+        return [call() for call in calls]
+    first, *rest = calls
+    futures = [query_pool.submit(in_query_context, call, g.get('replica'), g.get('sql_stats')) for call in rest]
+    try:
+        result = first()
+    except Exception:
+        # let the other calls finish before the request retries elsewhere or fails
+        wait(futures)
+        raise
+    return [result] + [future.result() for future in futures]
+
+
+def upcoming_shows_count(now=None):
+    # COUNT(...) FILTER (WHERE start_time >= now) for queries outer-joined to Show
+    return db.func.count(Show.id).filter(Show.start_time >= (now or datetime.now())).label('num_upcoming_shows')
+
+
+def next_show_start(now):
+    # MIN(start_time) FILTER (WHERE start_time >= now): when the upcoming count next drops
+    return db.func.min(Show.start_time).filter(Show.start_time >= now).label('next_show_at')
+
+
+# in-process trigram indexes used for search when the database has no pg_trgm (SQLite)
+search_indexes = {}
+
+
+def search_index(model):
+    index = search_indexes.get(model)
+    if index is None:
+        index = TrigramIndex(db.session.query(model.id, model.search_text))
+        search_indexes[model] = index
+    return index
+
+
+def search_catalog(model, search_string):
+    # total number of matches plus the best SEARCH_RESULT_LIMIT of them with their upcoming-show counters;
+    # matches are ranked by trigram similarity over name, city, state and genres
+    term = search_string.strip().lower()
+    limit = app.config['SEARCH_RESULT_LIMIT']
+    num_upcoming_shows = model.upcoming_shows_count.label('num_upcoming_shows')
+
+    if db.engine.dialect.name != 'postgresql':
+        ranked = search_index(model).search(term)
+        scores = dict(ranked[:limit])
+        rows = db.session.query(model.id, model.name, num_upcoming_shows).\
+            filter(model.id.in_(list(scores))).\
+            all()
+        rows.sort(key=lambda row: (-scores[row.id], row.name or '', row.id))
+        return len(ranked), rows
+
+    # substring matches and fuzzy (word similarity) matches both use the pg_trgm GIN index
+    rank = db.func.word_similarity(term, model.search_text).label('rank')
+    matches = db.session.query(model.id, model.name, rank).\
+        filter(db.or_(model.search_text.ilike(contains_pattern(term), escape='\\'),
+                      db.literal(term).op('<%')(model.search_text)))
+    total = matches.count()
+
+    # the counters are columns of the matched rows, so the capped page needs no join or aggregate
+    rows = matches.add_columns(num_upcoming_shows).\
+        order_by(rank.desc(), model.name, model.id).\
+        limit(limit).\
+        all()
+    return total, rows
+
+
+def has_genres(model, genres):
+    # rows whose genres include every one of `genres`: genres @> ARRAY[...] on Postgres (GIN indexed),
+    # json_each() lookups on SQLite
+    if db.engine.dialect.name == 'postgresql':
+        return model.genres.contains(db.cast(genres, postgresql.ARRAY(db.String(120))))
+    clauses = []
+    for genre in genres:
+        genre_values = db.func.json_each(model.genres).table_valued('value')
+        clauses.append(db.select(db.literal(1)).select_from(genre_values).where(genre_values.c.value == genre).exists())
+    return db.and_(*clauses)
+
+
+def show_counts(show_fk, entity_id, now):
+    # (upcoming count, past count, next upcoming start_time) of a venue's or artist's shows in one query
+    return db.session.query(
+        upcoming_shows_count(now),
+        db.func.count(Show.id).filter(Show.start_time < now),
+        next_show_start(now)
+    ).filter(show_fk == entity_id).\
+        one()
+
+
+def show_tiles_query(show_fk, entity_id, counterpart, prefix):
+    # a venue's or artist's shows joined to the other side (prefix_id, prefix_name, prefix_image_link)
+    return db.session.query(
+        Show.id,
+        Show.start_time,
+        counterpart.id.label(prefix + '_id'),
+        counterpart.name.label(prefix + '_name'),
+        counterpart.image_link.label(prefix + '_image_link')
+    ).join(counterpart, getattr(Show, prefix + '_id') == counterpart.id).\
+        filter(show_fk == entity_id)
+
+
+def partitioned_shows(show_fk, entity_id, counterpart, prefix, limit, now=None):
+    """First `limit` upcoming (soonest first) and past (latest first) shows, in one query.
+
+    ROW_NUMBER() over the upcoming/past partition caps each section in SQL, so a venue
+    with thousands of past shows still only transfers `limit` of them. Returns
+    (upcoming, past) lists of raw rows.
+    """
+    is_upcoming = Show.start_time >= (now or datetime.now())
+    position = db.func.row_number().over(
+        partition_by=is_upcoming,
+        order_by=(db.case((is_upcoming, Show.start_time)).asc(), db.case((is_upcoming, Show.id)).asc(),
+                  Show.start_time.desc(), Show.id.desc())
+    )
+    ranked = show_tiles_query(show_fk, entity_id, counterpart, prefix).\
+        add_columns(is_upcoming.label('upcoming'), position.label('position')).\
+        subquery()
+    rows = db.session.query(ranked).\
+        filter(ranked.c.position <= limit).\
+        order_by(ranked.c.position).\
+        all()
+
+    upcoming, past = [], []
+    for row in rows:
+        (upcoming if row.upcoming else past).append(row)
+    return upcoming, past
+
+
+def more_shows_url(endpoint, entity_id_arg, entity_id, when, rows, total):
+    # "load more" link continuing after the last rendered show of a section, if any are left
+    if len(rows) >= total:
+        return None
+    cursor = encode_cursor((rows[-1].start_time, rows[-1].id))
+    return url_for(endpoint, when=when, cursor=cursor, **{entity_id_arg: entity_id})
+
+
+def more_shows(show_fk, entity_id, counterpart, prefix):
+    # next page of one section for the "load more" endpoints
+    when = request.args.get('when', 'upcoming')
+    if when not in ('upcoming', 'past'):
+        abort(400)
+    query = show_tiles_query(show_fk, entity_id, counterpart, prefix)
+    if when == 'upcoming':
+        query = query.filter(Show.start_time >= datetime.now())
+    else:
+        query = query.filter(Show.start_time < datetime.now())
+    page = paginate(query, [Show.start_time, Show.id], key=lambda show: (show.start_time, show.id),
+                    descending=(when == 'past'))
+    if when == 'upcoming' and page.items:
+        # the soonest of these shows leaves the upcoming section when it starts
+        expire_response_at(page.items[0].start_time)
+    return page
+
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#----------------------------------------------------------------------------#
+
+def replica_reads(view):
+    """Run a read-only view against a read replica, if any are configured.
+
+    Replicas are taken in turn; one that fails to connect is marked down and the
+    view is retried on the next healthy replica, then on the primary. A client
+    that wrote within REPLICA_STICKY_SECONDS reads from the primary so it sees
+    its own changes.
+    """
+    @wraps(view)
+    def wrapper(**view_args):
+        g.read_only = True
+        if not replica_set or session.get('primary_until', 0) > time.time():
+            return view(**view_args)
+        for replica in replica_set.candidates():
+            g.replica = replica
+            try:
+                return view(**view_args)
+            except OperationalError as error:
+                db.session.rollback()
+                replica_set.mark_down(replica)
+                app.logger.warning('replica %s failed, marked down: %s', replica, error)
+        g.replica = None
+        return view(**view_args)
+    return wrapper
+
+
+def replica_may_lag(entry_key):
+    # whether a value for this cache entry was read from a replica that may not have the change
+    # that invalidated one of its tags yet; such values are not stored
+    return g.get('replica') is not None and \
+        time.time() - response_cache.invalidated_at(entry_key) < app.config['REPLICA_STICKY_SECONDS']
+
+
+@app.before_request
+def route_to_primary():
+    # requests start on the primary; g outlives a request when a test or script keeps an app context pushed
+    g.pop('replica', None)
+    g.pop('read_only', None)
+
+
+@app.after_request
+def stick_to_primary(response):
+    # after a successful write, this client's reads go to the primary for a while (read your writes)
+    if replica_set and request.method not in ('GET', 'HEAD', 'OPTIONS') and not g.get('read_only') \
+            and response.status_code < 400:
+        session['primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+
+#----------------------------------------------------------------------------#
+# Caching.
+#----------------------------------------------------------------------------#
+
+response_cache = TaggedCache(make_backend(app.config))
+
+
+def seconds_until(when):
+    # cache timeout ending at `when`; None (the backend default) when nothing is due
+    if when is None:
+        return None
+    return max((when - datetime.now()).total_seconds(), 0)
+
+
+def expire_response_at(when):
+    # the page being rendered changes at `when` (a show starts), so cached_view must not keep it past then
+    if when is not None and ('cache_expires_at' not in g or when < g.cache_expires_at):
+        g.cache_expires_at = when
+
+
+def cached_view(*tags):
+    """Serve a GET view from response_cache, keyed by path and query string.
+
+    `tags` name what the page renders and may use the view arguments, e.g.
+    'venue:{venue_id}'; write handlers invalidate those tags after committing.
+    Views whose output depends on the clock call expire_response_at() and the
+    entry then expires at that time rather than after CACHE_DEFAULT_TIMEOUT.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            # a pending flash message makes the page per-user, and rendering it consumes the message
+            if '_flashes' in session:
+                return view(**view_args)
+            key = 'view:{}?{}'.format(request.path, urlencode(sorted(request.args.items(multi=True))))
+            entry_key, cached = response_cache.lookup(key, [tag.format(**view_args) for tag in tags],
+                                                      name=request.endpoint)
+            if cached is not None:
+                body, status, content_type = cached
+                return app.response_class(body, status=status, content_type=content_type)
+
+            g.pop('cache_expires_at', None)
+            response = make_response(view(**view_args))
+            timeout = seconds_until(g.pop('cache_expires_at', None))
+            if response.status_code == 200 and not response.is_streamed and timeout != 0 \
+                    and not replica_may_lag(entry_key):
+                response_cache.store(entry_key, (response.get_data(), response.status_code, response.content_type),
+                                     timeout=timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional(validators):
+    """Answer If-None-Match / If-Modified-Since with 304 before the view runs.
+
+    `validators(**view_args)` returns (etag, last_modified) from a cheap query, or
+    None to just run the view (e.g. it will 404). Goes outside cached_view, so a
+    revalidation only costs the validator query.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            found = None if '_flashes' in session else validators(**view_args)
+            if found is None:
+                return view(**view_args)
+            etag, last_modified = found
+            # naive datetimes in this app are local time; headers are in GMT
+            last_modified = last_modified and last_modified.astimezone(timezone.utc)
+            if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = make_response(view(**view_args))
+                if response.status_code != 200:
+                    return response
+            else:
+                response = app.response_class(status=304)
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            # shared caches may keep the page but must revalidate it on every request
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def validator_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def detail_validators(model, entity_id):
+    """(ETag, Last-Modified) of a venue or artist page from its own row, or None to just run the view.
+
+    The row's version and updated_at move with everything the page shows: edits of
+    the row, shows added, removed or moved, renamed counterparts (see the Show and
+    touch_counterparts events) and the rollover once an upcoming show has started.
+    Between that start and the rollover the stored split is out of date, so there
+    is no validator and the page is rendered.
+    """
+    row = db.session.query(model.version, model.updated_at, model.next_show_at).\
+        filter(model.id == entity_id).\
+        first()
+    if row is None or (row.next_show_at is not None and row.next_show_at < datetime.now()):
+        return None
+    return validator_etag(model.__tablename__, entity_id, row.version), row.updated_at
+
+
+def venue_validators(venue_id):
+    return detail_validators(Venue, venue_id)
+
+
+def artist_validators(artist_id):
+    return detail_validators(Artist, artist_id)
+
+
+def shows_validators():
+    # the shows listing changes with any show write and any venue or artist rename, all counted by one row
+    row = db.session.query(ChangeCounter.version, ChangeCounter.changed_at).\
+        filter(ChangeCounter.name == 'shows').\
+        first()
+    if row is None:
+        return None
+    return validator_etag('Show', row.version), row.changed_at
+
+
+ShowPartitions = namedtuple('ShowPartitions', ['upcoming', 'upcoming_count', 'past', 'past_count', 'next_show_at'])
+
+
+def show_partitions(tag, show_fk, entity_id, counterpart, prefix, load_entity):
+    """A venue or artist (`load_entity()`, None if missing) with its upcoming/past counts and first shows.
+
+    The show data is cached until the next show starts: the split only moves when an
+    upcoming show starts, so the entry expires at the soonest upcoming start_time (and
+    is kept for the default timeout when nothing is upcoming); adding, editing or
+    deleting shows invalidates `tag` as usual. On a miss the lookup, the counts and the
+    shows run concurrently. Returns (entity, ShowPartitions).
+    """
+    entry_key, partitions = response_cache.lookup('partitions:' + tag, [tag], name='partitions')
+    if partitions is not None:
+        entity = load_entity()
+    else:
+        now = datetime.now()
+        limit = app.config['DETAIL_SHOWS_LIMIT']
+        entity, (upcoming_count, past_count, next_show_at), (upcoming, past) = concurrently(
+            load_entity,
+            lambda: show_counts(show_fk, entity_id, now),
+            lambda: partitioned_shows(show_fk, entity_id, counterpart, prefix, limit, now=now))
+        if entity is None:
+            return None, None
+        partitions = ShowPartitions(upcoming, upcoming_count, past, past_count, next_show_at)
+        timeout = seconds_until(next_show_at)
+        if timeout != 0 and not replica_may_lag(entry_key):
+            response_cache.store(entry_key, partitions, timeout=timeout)
+    if entity is not None:
+        expire_response_at(partitions.next_show_at)
+    return entity, partitions
+
+
+def venue_cache_tags(venue_id):
+    # everything that renders this venue: the listings, its page and the pages of artists playing there
+    artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+    return ['venues', 'shows', 'venue:{}'.format(venue_id)] + \
+        ['artist:{}'.format(artist_id) for artist_id, in artist_ids]
+
+
+def artist_cache_tags(artist_id):
+    # everything that renders this artist: the listings, its page and the pages of venues it plays at
+    venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+    return ['artists', 'shows', 'artist:{}'.format(artist_id)] + \
+        ['venue:{}'.format(venue_id) for venue_id, in venue_ids]
+
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -97,9 +887,6 @@ app.jinja_env.filters['datetime'] = format_datetime
 
 @app.route('/')
 def index():
-    # hack :(
-    # loads seed data to DB
-    seed_data()
     return render_template('pages/home.html')
 
 
@@ -107,66 +894,44 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@replica_reads
+@cached_view('venues')
 def venues():
 
-    venue_query = Venue.query.\
-        group_by(Venue.id, Venue.state, Venue.city).order_by(Venue.state, Venue.city).all()
-    city_and_state = ''
-    citystate = []
-    data2 = []
-    for venue in venue_query:
-        upcoming_shows = Show.query.filter_by(venue_id=venue.id).\
-            filter(Show.start_time >= datetime.now()).\
-            all()
+    # a keyset page of venues in listing order: by area, busiest first within each city, so a page
+    # holds ?limit= venues however they spread over cities (a city split across pages continues on the next)
+    # ?genre=Jazz (repeatable) keeps only venues playing all of the given genres
+    genres = request.args.getlist('genre')
+    venue_query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                                   Venue.upcoming_shows_count.label('num_upcoming_shows'), Venue.next_show_at)
+    if genres:
+        venue_query = venue_query.filter(has_genres(Venue, genres))
+    page = paginate(venue_query, VENUE_LISTING_ORDER,
+                    key=lambda venue: (venue.state, venue.city, -venue.num_upcoming_shows, venue.id))
+    venue_rows = page.items
+    # the counts are right until the first of these venues' upcoming shows starts and the rollover runs
+    # (a page with a show already started is not cached at all until then)
+    expire_response_at(min((venue.next_show_at for venue in venue_rows if venue.next_show_at), default=None))
 
-        if city_and_state == venue.city + venue.state:
-            data2[len(data2) - 1]["venues"].append({
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": len(upcoming_shows)
-            })
-        else:
-            city_and_state = venue.city + venue.state
-            citystate.append((venue.city, venue.state))
-            data2.append({
-                "city": venue.city,
-                "state": venue.state,
-                "venues": [{
-                    "id": venue.id,
-                    "name": venue.name,
-                    "num_upcoming_shows": len(upcoming_shows)
-                }]
-            })
-
-    for i in data2:
-        if "venues" in i:
-            i["venues"] = sorted(i["venues"], key=lambda venue: venue['num_upcoming_shows'], reverse=True)
+    data2 = []
+    for (state, city), area_venues in groupby(venue_rows, key=lambda venue: (venue.state, venue.city)):
+        data2.append({
+            "city": city,
+            "state": state,
+            "venues": list(area_venues)
+        })
 
-    return render_template('pages/venues.html', areas=data2);
+    return render_template('pages/venues.html', areas=data2, page=page, genres=genres)
 
 
 @app.route('/venues/search', methods=['POST'])
+@replica_reads
 def search_venues():
     # get search string from the form
     search_string = ''.join(request.form.get('search_term', ''))
 
-    # query all the venues from DB that contain search string in lowercase
-    venues = Venue.query.filter(Venue.name.ilike('%'+f'%{search_string}%'+'%')).all()
-    # count matches quantity
-    venues_number = len(venues)
-    data = []
-
-    for venue in venues:
-        # filter upcoming shows for the venue
-        shows_number = Show.query.filter_by(venue_id=venue.id). \
-        filter(Show.start_time >= datetime.now()). \
-        count()
-
-        data.append({
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": shows_number
-        })
+    # venues matching the search string by name, city, state or genre, with upcoming-show counts
+    venues_number, data = search_catalog(Venue, search_string)
 
     response = {
         "count": venues_number,
@@ -176,44 +941,37 @@ def search_venues():
 
 
 @app.route('/venues/<int:venue_id>', methods=['GET'])
+@replica_reads
+@conditional(venue_validators)
+@cached_view('venue:{venue_id}')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
 
-    venue = Venue.query.get(venue_id)
-    # replace separators in the genres string so it would come as a list (comes as a list of chracters otherwise)
-    venue.genres = ''.join(list(filter(lambda x: x != '{' and x != '}' and x != '"', venue.genres))).split(',')
-    venue.upcoming_shows = []
-    venue.past_shows = []
-    # retrieveing only upcoming shows from database
-    upcoming_shows = Show.query.filter_by(venue_id=venue_id). \
-        filter(Show.start_time >= datetime.now()). \
-        all()
-
-    # retrieveing upcoming shows' artists information for the venue
-    for show in upcoming_shows:
-        venue.upcoming_shows.append({
-            "artist_id": show.artist_id,
-            "artist_name": Artist.query.filter_by(id=show.artist_id).first().name,
-            "artist_image_link": Artist.query.filter_by(id=show.artist_id).first().image_link,
-            "start_time": format_datetime(str(show.start_time))
-        })
+    # the venue with its upcoming and past shows (their artists' name and image, each section capped in SQL)
+    venue, shows = show_partitions('venue:{}'.format(venue_id), Show.venue_id, venue_id, Artist, 'artist',
+                                   lambda: db.session.get(Venue, venue_id))
+    if venue is None:
+        abort(404)
+    venue.upcoming_shows = shows.upcoming
+    # exact counts as of now (the counter columns lag until the rollover), set without dirtying the row
+    set_committed_value(venue, 'upcoming_shows_count', shows.upcoming_count)
+    venue.upcoming_shows_more_url = more_shows_url('venue_shows', 'venue_id', venue_id, 'upcoming',
+                                                   shows.upcoming, shows.upcoming_count)
+    venue.past_shows = shows.past
+    set_committed_value(venue, 'past_shows_count', shows.past_count)
+    venue.past_shows_more_url = more_shows_url('venue_shows', 'venue_id', venue_id, 'past',
+                                               shows.past, shows.past_count)
+    return render_template('pages/show_venue.html', venue=venue)
 
-    venue.upcoming_shows_count = len(upcoming_shows)
-    # retrieveing only past shows from database
-    past_shows = Show.query.filter_by(venue_id=venue_id). \
-        filter(Show.start_time < datetime.now()). \
-        all()
-    # retrieveing past shows' artists information for the venue
-    for show in past_shows:
-        venue.past_shows.append({
-            "artist_id": show.artist_id,
-            "artist_name": Artist.query.filter_by(id=show.artist_id).first().name,
-            "artist_image_link": Artist.query.filter_by(id=show.artist_id).first().image_link,
-            "start_time": format_datetime(str(show.start_time))
-        })
 
-    venue.past_shows_count = len(past_shows)
-    return render_template('pages/show_venue.html', venue=venue)
+@app.route('/venues/<int:venue_id>/shows')
+@replica_reads
+@cached_view('venue:{venue_id}')
+def venue_shows(venue_id):
+    # "load more" fragment: the next page of a venue's upcoming or past shows
+    page = more_shows(Show.venue_id, venue_id, Artist, 'artist')
+    return render_template('pages/venue_show_tiles.html', shows=page.items,
+                           more_url=page.next_cursor and page_url(page.next_cursor))
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -239,6 +997,7 @@ def create_venue_submission():
         # pass form's data to DB
         db.session.add(venue)
         db.session.commit()
+        response_cache.invalidate('venues')
         flash('Venue ' + form.name.data + ' was successfully updated!')
 
     except ValueError as e:
@@ -257,8 +1016,10 @@ def delete_venue(venue_id):
 
     try:
         venue = Venue.query.filter_by(id=venue_id).first_or_404()
+        cache_tags = venue_cache_tags(venue.id)
         db.session.delete(venue)
         db.session.commit()
+        response_cache.invalidate(*cache_tags)
         flash("Venue is deleted successfully!")
         return render_template('pages/home.html')
     except ValueError:
@@ -273,38 +1034,31 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 
 @app.route('/artists')
+@replica_reads
+@cached_view('artists')
 def artists():
 
-    artists_query = Artist.query.order_by(Artist.name).all()
-    data = []
-    for artist in artists_query:
-        data.append(artist)
+    # ?genre=Jazz (repeatable) keeps only artists playing all of the given genres
+    genres = request.args.getlist('genre')
+    artists_query = db.session.query(Artist.id, Artist.name)
+    if genres:
+        artists_query = artists_query.filter(has_genres(Artist, genres))
+    if streaming():
+        return stream_listing('pages/artists.html', 'artists', artists_query.order_by(Artist.name, Artist.id),
+                              genres=genres)
+    page = paginate(artists_query, [Artist.name, Artist.id], key=lambda artist: (artist.name, artist.id))
 
-    return render_template('pages/artists.html', artists=data)
+    return render_template('pages/artists.html', artists=page.items, page=page, genres=genres)
 
 
 @app.route('/artists/search', methods=['POST'])
+@replica_reads
 def search_artists():
     # get search string from the form
     search_string = ''.join(request.form.get('search_term', ''))
 
-    # query all the artists from DB that contain search string in lowercase
-    artists = Artist.query.filter(Artist.name.ilike('%' + f'%{search_string}%' + '%')).all()
-    # count matches quantity
-    artists_number = len(artists)
-    data = []
-
-    for artist in artists:
-        # filter upcoming shows for the artist
-        shows_number = Show.query.filter_by(artist_id=artist.id). \
-            filter(Show.start_time >= datetime.now()). \
-            count()
-
-        data.append({
-            "id": artist.id,
-            "name": artist.name,
-            "num_upcoming_shows": shows_number
-        })
+    # artists matching the search string by name, city, state or genre, with upcoming-show counts
+    artists_number, data = search_catalog(Artist, search_string)
 
     response = {
         "count": artists_number,
@@ -314,42 +1068,38 @@ def search_artists():
 
 
 @app.route('/artists/<int:artist_id>')
+@replica_reads
+@conditional(artist_validators)
+@cached_view('artist:{artist_id}')
 def show_artist(artist_id):
     # shows the venue page with the given venue_id
 
-    artist = Artist.query.filter_by(id=artist_id).first()
-    artist.genres = ''.join(list(filter(lambda x: x != '{' and x != '}' and x != '"', artist.genres))).split(',')
-    artist.upcoming_shows = []
-    artist.past_shows = []
-    upcoming_shows = Show.query.filter_by(artist_id=artist_id).\
-            filter(Show.start_time >= datetime.now()).\
-            all()
-
-    for show in upcoming_shows:
-        artist.upcoming_shows.append({
-            "venue_id": show.venue_id,
-            "venue_name": Venue.query.filter_by(id=show.venue_id).first().name,
-            "venue_image_link": Venue.query.filter_by(id=show.venue_id).first().image_link,
-            "start_time": format_datetime(str(show.start_time))
-        })
-
-    artist.upcoming_shows_count = len(upcoming_shows)
+    # the artist with its upcoming and past shows (their venues' name and image, each section capped in SQL)
+    artist, shows = show_partitions('artist:{}'.format(artist_id), Show.artist_id, artist_id, Venue, 'venue',
+                                    lambda: db.session.get(Artist, artist_id))
+    if artist is None:
+        abort(404)
+    artist.upcoming_shows = shows.upcoming
+    # exact counts as of now (the counter columns lag until the rollover), set without dirtying the row
+    set_committed_value(artist, 'upcoming_shows_count', shows.upcoming_count)
+    artist.upcoming_shows_more_url = more_shows_url('artist_shows', 'artist_id', artist_id, 'upcoming',
+                                                    shows.upcoming, shows.upcoming_count)
+    artist.past_shows = shows.past
+    set_committed_value(artist, 'past_shows_count', shows.past_count)
+    artist.past_shows_more_url = more_shows_url('artist_shows', 'artist_id', artist_id, 'past',
+                                                shows.past, shows.past_count)
 
-    past_shows = Show.query.filter_by(artist_id=artist_id). \
-        filter(Show.start_time < datetime.now()). \
-        all()
-
-    for show in past_shows:
-        artist.past_shows.append({
-            "venue_id": show.venue_id,
-            "venue_name": Venue.query.filter_by(id=show.venue_id).first().name,
-            "venue_image_link": Venue.query.filter_by(id=show.venue_id).first().image_link,
-            "start_time": format_datetime(str(show.start_time))
-        })
+    return render_template('pages/show_artist.html', artist=artist)
 
-    artist.past_shows_count = len(past_shows)
 
-    return render_template('pages/show_artist.html', artist=artist)
+@app.route('/artists/<int:artist_id>/shows')
+@replica_reads
+@cached_view('artist:{artist_id}')
+def artist_shows(artist_id):
+    # "load more" fragment: the next page of an artist's upcoming or past shows
+    page = more_shows(Show.artist_id, artist_id, Venue, 'venue')
+    return render_template('pages/artist_show_tiles.html', shows=page.items,
+                           more_url=page.next_cursor and page_url(page.next_cursor))
 
 #  Update
 #  ----------------------------------------------------------------
@@ -357,10 +1107,8 @@ def show_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     artist = Artist.query.filter_by(id=artist_id).first_or_404()
+    # genres come back from the ARRAY column as a list, ready for the multi-select
     form = ArtistForm(obj=artist)
-
-    # replace separators in the genres string so it would come as a list (comes as a list of chracters otherwise)
-    form.genres.data = ''.join(list(filter(lambda x: x != '{' and x != '}' and x != '"', artist.genres))).split(',')
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
@@ -383,6 +1131,7 @@ def edit_artist_submission(artist_id):
         artist.seeking_venue = form.seeking_venue.data
         artist.seeking_description = form.seeking_description.data
         db.session.commit()
+        response_cache.invalidate(*artist_cache_tags(artist_id))
         flash('Artist ' + form.name.data + ' was successfully updated!')
 
     except ValueError as e:
@@ -399,11 +1148,8 @@ def edit_artist_submission(artist_id):
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     venue = Venue.query.filter_by(id=venue_id).first_or_404()
+    # genres come back from the ARRAY column as a list, ready for the multi-select
     form = VenueForm(obj=venue)
-
-    # replace separators in the genres string so it would come as a list (comes as a list of characters otherwise)
-    form.genres.data = ''.join(list(filter(lambda x: x != '{' and x != '}' and x != '"', venue.genres))).split(',')
-
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
@@ -427,6 +1173,7 @@ def edit_venue_submission(venue_id):
         venue.seeking_talent = form.seeking_talent.data
         venue.seeking_description = form.seeking_description.data
         db.session.commit()
+        response_cache.invalidate(*venue_cache_tags(venue_id))
         flash('Venue ' + form.name.data + ' was successfully updated!')
 
     except ValueError as e:
@@ -445,8 +1192,10 @@ def delete_artist(artist_id):
 
     try:
         artist = Artist.query.filter_by(id=artist_id).first_or_404()
+        cache_tags = artist_cache_tags(artist.id)
         db.session.delete(artist)
         db.session.commit()
+        response_cache.invalidate(*cache_tags)
         flash("Artist is deleted successfully!")
         return render_template('pages/home.html')
     except ValueError:
@@ -480,6 +1229,7 @@ def create_artist_submission():
         # pass form's data to DB
         db.session.add(artist)
         db.session.commit()
+        response_cache.invalidate('artists')
         flash('Artist ' + form.name.data + ' was successfully created!')
 
     except ValueError as e:
@@ -497,21 +1247,28 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@replica_reads
+@conditional(shows_validators)
+@cached_view('shows')
 def shows():
     # displays list of shows at /shows
-    all_shows = Show.query.all()
-    data2 = []
-    for show in all_shows:
-        data2.append({
-            "venue_id": show.venue_id,
-            "venue_name": Venue.query.filter_by(id=show.venue_id).first().name,
-            "artist_id": show.artist_id,
-            "artist_name": Artist.query.filter_by(id=show.artist_id).first().name,
-            "artist_image_link": Artist.query.filter_by(id=show.artist_id).first().image_link,
-            "start_time": format_datetime(str(show.start_time))
-        })
-
-    return render_template('pages/shows.html', shows=data2)
+    # one joined query projecting only the columns the template needs,
+    # instead of three Venue/Artist lookups per show
+    shows_query = db.session.query(
+        Show.id,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.start_time
+    ).join(Venue, Show.venue_id == Venue.id).\
+        join(Artist, Show.artist_id == Artist.id)
+    if streaming():
+        return stream_listing('pages/shows.html', 'shows', shows_query.order_by(Show.start_time, Show.id))
+    page = paginate(shows_query, [Show.start_time, Show.id], key=lambda show: (show.start_time, show.id))
+
+    return render_template('pages/shows.html', shows=page.items, page=page)
 
 
 @app.route('/shows/create')
@@ -529,11 +1286,15 @@ def create_show_submission():
     try:
         artist_id = request.form['artist_id']
         venue_id = request.form['venue_id']
-        start_time = request.form['start_time']
+        # a datetime, not the raw string: the counter events compare it with the current time
+        start_time = dateutil.parser.parse(request.form['start_time'])
 
         show = Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time)
         db.session.add(show)
         db.session.commit()
+        # the show appears on the shows listing, both sides' pages and their upcoming counts
+        response_cache.invalidate('shows', 'venues', 'artists', 'venue:{}'.format(show.venue_id),
+                                  'artist:{}'.format(show.artist_id))
         body['artist_id'] = show.artist_id
         body['venue_id'] = show.venue_id
         body['start_time'] = show.start_time
@@ -553,6 +1314,38 @@ def create_show_submission():
     return render_template('pages/home.html'), body
 
 
+@app.route('/healthz')
+def healthz():
+    # database round trip plus this worker's connection pool state; 503 when the database is unreachable
+    pool = db.engine.pool
+    stats = {'pool': type(pool).__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_out=pool.checkedout(), checked_in=pool.checkedin(),
+                     overflow=pool.overflow())
+    with pool_counters_lock:
+        stats.update(pool_counters)
+    started = time.perf_counter()
+    try:
+        db.session.execute(db.text('SELECT 1'))
+    except SQLAlchemyError as error:
+        db.session.rollback()
+        return jsonify(status='unavailable', error=str(getattr(error, 'orig', None) or error), pool=stats), 503
+    return jsonify(status='ok', database_ms=round((time.perf_counter() - started) * 1000, 3), pool=stats,
+                   replicas=replica_set.status())
+
+
+@app.route('/metrics/cache')
+def cache_metrics():
+    # response cache hit/miss counters for this worker, overall and per endpoint
+    return jsonify(response_cache.stats())
+
+
+@app.route('/metrics/templates')
+def template_metrics():
+    # render time histograms per template for this worker, SQL run while rendering excluded
+    return jsonify(template_instrumentation.stats())
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -563,158 +1356,842 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-# load seed data if the tables are empty
-def seed_data():
-
-    # add venue seed data
-    if db.session.query(Venue).count() == 0:
-        venue_seed = [{
-            "name": "The Musical Hop",
-            "genres": ["Jazz", "Reggae", "Swing", "Classical", "Folk"],
-            "address": "1015 Folsom Street",
-            "city": "San Francisco",
-            "state": "CA",
-            "phone": "123-123-1234",
-            "website": "https://www.themusicalhop.com",
-            "facebook_link": "https://www.facebook.com/TheMusicalHop",
-            "seeking_talent": True,
-            "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
-            "image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60"
-        }, {
-            "name": "The Dueling Pianos Bar",
-            "genres": ["Classical", "R&B", "Hip-Hop"],
-            "address": "335 Delancey Street",
-            "city": "New York",
-            "state": "NY",
-            "phone": "914-003-1132",
-            "website": "https://www.theduelingpianos.com",
-            "facebook_link": "https://www.facebook.com/theduelingpianos",
-            "seeking_talent": False,
-            "image_link": "https://images.unsplash.com/photo-1497032205916-ac775f0649ae?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=750&q=80"
-        }, {
-            "name": "Park Square Live Music & Coffee",
-            "genres": ["Rock n Roll", "Jazz", "Classical", "Folk"],
-            "address": "34 Whiskey Moore Ave",
-            "city": "San Francisco",
-            "state": "CA",
-            "phone": "415-000-1234",
-            "website": "https://www.parksquarelivemusicandcoffee.com",
-            "facebook_link": "https://www.facebook.com/ParkSquareLiveMusicAndCoffee",
-            "seeking_talent": False,
-            "image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80"
-        }]
-
-        for venue in venue_seed:
-            g = Venue(**venue)
-            db.session.add(g)
-            db.session.commit()
+#----------------------------------------------------------------------------#
+# Bulk import and export.
+#----------------------------------------------------------------------------#
 
-    # add atrist seed data
-    if db.session.query(Artist).count() == 0:
-        artist_seed = [{
-            "id": 4,
-            "name": "Guns N Petals",
-            "genres": ["Rock n Roll"],
-            "city": "San Francisco",
-            "state": "CA",
-            "phone": "326-123-5000",
-            "website": "https://www.gunsnpetalsband.com",
-            "facebook_link": "https://www.facebook.com/GunsNPetals",
-            "seeking_venue": True,
-            "seeking_description": "Looking for shows to perform at in the San Francisco Bay Area!",
-            "image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80"
-        }, {
-            "id": 5,
-            "name": "Matt Quevedo",
-            "genres": ["Jazz"],
-            "city": "New York",
-            "state": "NY",
-            "phone": "300-400-5000",
-            "facebook_link": "https://www.facebook.com/mattquevedo923251523",
-            "seeking_venue": False,
-            "image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80"
-        }, {
-            "id": 6,
-            "name": "The Wild Sax Band",
-            "genres": ["Jazz", "Classical"],
-            "city": "San Francisco",
-            "state": "CA",
-            "phone": "432-325-5432",
-            "seeking_venue": False,
-            "image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80"
-        }]
-
-        for artist in artist_seed:
-            g = Artist(**artist)
-            db.session.add(g)
-            db.session.commit()
+# what "flask import" and POST /api/v1/<kind>:bulk load, and the form whose rules each row must pass
+IMPORT_KINDS = {
+    'venues': (Venue, VenueForm),
+    'artists': (Artist, ArtistForm),
+    'shows': (Show, ShowForm),
+}
+
+
+def import_form_data(row):
+    # one CSV/JSON row as form data: genres as a list ("Jazz, Folk" in CSV), booleans as checkbox values
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None or key is None:
+            continue
+        if key == 'genres':
+            if isinstance(value, str):
+                value = [genre.strip() for genre in value.split(',') if genre.strip()]
+            data.setlist(key, value)
+        elif isinstance(value, bool):
+            data[key] = 'y' if value else ''
+        elif key == 'start_time' and isinstance(value, str) and 'T' in value:
+            # ISO 8601 (as the API writes it) in the form's "%Y-%m-%d %H:%M:%S"
+            try:
+                data[key] = datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                data[key] = value
+        else:
+            data[key] = str(value)
+    # shows may name their venue and artist instead of giving ids
+    for side in ('venue', 'artist'):
+        if side in data and side + '_id' not in data:
+            data[side + '_id'] = data.pop(side)
+    return data
+
+
+def validate_import_rows(model, form_class, batch):
+    # ([(row number, column values)], [error]) for one batch of (row number, row) pairs
+    valid, errors = [], []
+    for number, row in batch:
+        if isinstance(row, UnreadableRow):
+            errors.append({'row': number, 'errors': {'row': [row.message]}})
+            continue
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'errors': {'row': ['expected an object of column values, got {}'.format(
+                type(row).__name__)]}})
+            continue
+        form = form_class(formdata=import_form_data(row), meta={'csrf': False})
+        if form.validate():
+            valid.append((number, {field.name: field.data for field in form if field.name in model.__table__.columns}))
+        else:
+            errors.append({'row': number, 'errors': form.errors})
+    return valid, errors
+
+
+def resolve_show_references(valid):
+    """Replace the venue_id/artist_id of validated show rows (an id or an exact name) with ids.
+
+    One query per side for the whole batch; rows whose reference is unknown or
+    names more than one venue/artist become errors.
+    """
+    resolved = {}
+    for side, model in (('venue_id', Venue), ('artist_id', Artist)):
+        references = {values[side].strip() for _, values in valid}
+        ids = [int(reference) for reference in references if reference.isdigit()]
+        names = [reference for reference in references if not reference.isdigit()]
+        by_name = {}
+        known_ids = set()
+        for entity_id, name in db.session.query(model.id, model.name).\
+                filter(db.or_(model.id.in_(ids), model.name.in_(names))):
+            known_ids.add(entity_id)
+            by_name.setdefault(name, []).append(entity_id)
+        resolved[side] = known_ids, by_name
+
+    rows, errors = [], []
+    for number, values in valid:
+        row_errors = {}
+        for side in ('venue_id', 'artist_id'):
+            known_ids, by_name = resolved[side]
+            reference = values[side].strip()
+            if reference.isdigit():
+                matches = [int(reference)] if int(reference) in known_ids else []
+            else:
+                matches = by_name.get(reference, [])
+            if len(matches) == 1:
+                values[side] = matches[0]
+            else:
+                problem = 'is ambiguous, use the id' if matches else 'does not exist'
+                row_errors[side] = ['{} {} {}'.format(side[:-3], reference, problem)]
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+        else:
+            rows.append(values)
+    return rows, errors
+
+
+def import_rows(kind, rows, batch_size):
+    """Validate and insert an iterable of row dicts, batch by batch.
+
+    Each batch is checked with the kind's form, show references are resolved with
+    one lookup per side, and the valid rows go in with bulk_insert (COPY on
+    Postgres). Invalid rows are reported and skipped; a batch the database
+    rejects is rolled back and reported with its row range without stopping the
+    import. If the stream itself becomes unreadable (bad CSV, bad encoding) the
+    rows read so far are still imported and the report says where it stopped.
+    Returns {'inserted': count, 'errors': [{'row': number, 'errors': {field: [message]}}]}.
+    """
+    model, form_class = IMPORT_KINDS[kind]
+    inserted, errors, tags = 0, [], {kind}
+    numbered = enumerate(rows, start=1)
+    last_read, unreadable = 0, None
+    try:
+        while unreadable is None:
+            batch = []
+            try:
+                for numbered_row in islice(numbered, batch_size):
+                    batch.append(numbered_row)
+                    last_read = numbered_row[0]
+            except (ValueError, csv.Error) as error:
+                unreadable = {'row': last_read + 1,
+                              'errors': {'file': ['could not read past row {}: {}'.format(last_read, error)]}}
+            if not batch:
+                break
+            valid, batch_errors = validate_import_rows(model, form_class, batch)
+            if kind == 'shows' and valid:
+                values, reference_errors = resolve_show_references(valid)
+                batch_errors.extend(reference_errors)
+            else:
+                values = [row for _, row in valid]
+            try:
+                inserted += bulk_insert(model, values, batch_size)
+            except SQLAlchemyError as error:
+                db.session.rollback()
+                message = 'rows {}-{} were not imported: {}'.format(batch[0][0], batch[-1][0],
+                                                                    getattr(error, 'orig', None) or error)
+                batch_errors.append({'row': batch[0][0], 'last_row': batch[-1][0], 'errors': {'batch': [message]}})
+            else:
+                if kind == 'shows':
+                    tags.update(('venues', 'artists'))
+                    tags.update('venue:{}'.format(row['venue_id']) for row in values)
+                    tags.update('artist:{}'.format(row['artist_id']) for row in values)
+            errors.extend(sorted(batch_errors, key=lambda error: error['row']))
+    finally:
+        # committed batches must show up even if a later one blew up
+        search_indexes.pop(model, None)
+        response_cache.invalidate(*tags)
+    if unreadable is not None:
+        errors.append(unreadable)
+    return {'inserted': inserted, 'errors': errors}
+
+
+def import_format(filename, content_type=None):
+    # 'csv', 'ndjson' or 'json', from the content type or else the file extension
+    if content_type:
+        return {'text/csv': 'csv', 'application/x-ndjson': 'ndjson', 'application/json': 'json'}.get(content_type)
+    extension = filename.rsplit('.', 1)[-1].lower()
+    return {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson', 'json': 'json'}.get(extension)
+
+
+# an NDJSON line that is not valid JSON, reported as that row's error
+UnreadableRow = namedtuple('UnreadableRow', ['message'])
+
+
+def ndjson_rows(stream):
+    for line in stream:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                yield UnreadableRow('invalid JSON: {}'.format(error))
+
+
+def read_import_rows(stream, format):
+    # row dicts from a text stream; CSV and NDJSON are read a line at a time, a JSON array all at once
+    if format == 'csv':
+        return csv.DictReader(stream)
+    if format == 'ndjson':
+        return ndjson_rows(stream)
+    rows = json.load(stream)
+    if not isinstance(rows, list):
+        raise ValueError('expected a JSON array of rows')
+    return rows
+
+
+# columns computed from other data, left out of exports
+DERIVED_COLUMNS = {'search_text', 'upcoming_shows_count', 'past_shows_count', 'next_show_at'}
+
+
+def export_fields(model):
+    # every column but the derived ones
+    return [column.name for column in model.__table__.columns if column.name not in DERIVED_COLUMNS]
+
+
+def export_csv_value(value):
+    # the inverse of import_form_data: genres as "Jazz, Folk", booleans as true/false, ISO 8601 datetimes
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, list):
+        return ', '.join(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_chunks(kind, format, since=None):
+    """NDJSON or CSV text for every row of `kind` changed at or after `since`, in updated_at order.
+
+    Rows come through a server-side cursor STREAM_YIELD_PER at a time and the text
+    leaves in STREAM_CHUNK_SIZE chunks, so memory stays flat however big the table.
+    Deleted rows are not exported.
+    """
+    model = IMPORT_KINDS[kind][0]
+    fields = export_fields(model)
+    query = db.session.query(*[getattr(model, field) for field in fields])
+    if since is not None:
+        query = query.filter(model.updated_at >= since)
+    rows = query.order_by(model.updated_at, model.id).yield_per(app.config['STREAM_YIELD_PER'])
+
+    if format == 'ndjson':
+        lines = (to_json(dict(zip(fields, row))) + '\n' for row in rows)
+    else:
+        lines = csv_lines(fields, ([export_csv_value(value) for value in row] for row in rows))
+    return buffered_chunks(lines, app.config['STREAM_CHUNK_SIZE'])
 
-    # add show seed data
-    if db.session.query(Show).count() == 0:
 
-        show_seed = []
+def next_export_since(started_at):
+    # the `since` for the next export: EXPORT_SINCE_OVERLAP before this one started, so rows that were
+    # flushed before it but committed after it are picked up next time (and some rows are exported twice)
+    return started_at - timedelta(seconds=app.config['EXPORT_SINCE_OVERLAP'])
 
-        # show 1, get ids of venues and atrists by their names
-        venue_id = Venue.query.filter_by(name="The Musical Hop").first().id
-        artist_id = Artist.query.filter_by(name="Guns N Petals").first().id
-        start_time = "2019-05-21T21:30:00.000Z"
-        show = {
-            "venue_id": venue_id,
-            "artist_id": artist_id,
-            "start_time": start_time
-        }
-        show_seed.append(show)
-
-        # show 2
-        venue_id = Venue.query.filter_by(name="Park Square Live Music & Coffee").first().id
-        artist_id = Artist.query.filter_by(name="Matt Quevedo").first().id
-        start_time = "2019-06-15T23:00:00.000Z"
-        show = {
-            "venue_id": venue_id,
-            "artist_id": artist_id,
-            "start_time": start_time
-        }
-        show_seed.append(show)
-
-        # show 3
-        venue_id = Venue.query.filter_by(name="Park Square Live Music & Coffee").first().id
-        artist_id = Artist.query.filter_by(name="The Wild Sax Band").first().id
-        start_time = "2035-04-01T20:00:00.000Z"
-        show = {
-            "venue_id": venue_id,
-            "artist_id": artist_id,
-            "start_time": start_time
-        }
-        show_seed.append(show)
-
-        # show 4
-        venue_id = Venue.query.filter_by(name="Park Square Live Music & Coffee").first().id
-        artist_id = Artist.query.filter_by(name="The Wild Sax Band").first().id
-        start_time = "2035-04-08T20:00:00.000Z"
-        show = {
-            "venue_id": venue_id,
-            "artist_id": artist_id,
-            "start_time": start_time
-        }
-        show_seed.append(show)
-
-        # show 5
-        venue_id = Venue.query.filter_by(name="Park Square Live Music & Coffee").first().id
-        artist_id = Artist.query.filter_by(name="The Wild Sax Band").first().id
-        start_time = "2035-04-15T20:00:00.000Z"
-        show = {
-            "venue_id": venue_id,
-            "artist_id": artist_id,
-            "start_time": start_time
+
+def csv_lines(header, rows):
+    # CSV text a line at a time
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in chain([header], rows):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+#----------------------------------------------------------------------------#
+# API.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# columns a client may ask for with ?fields=a,b,c; the default is every column
+VENUE_FIELDS = ['id', 'name', 'city', 'state', 'address', 'phone', 'website', 'genres', 'image_link',
+                'facebook_link', 'seeking_talent', 'seeking_description', 'updated_at']
+ARTIST_FIELDS = ['id', 'name', 'city', 'state', 'phone', 'website', 'genres', 'image_link',
+                 'facebook_link', 'seeking_venue', 'seeking_description', 'updated_at']
+SHOW_FIELDS = ['id', 'venue_id', 'artist_id', 'start_time', 'updated_at']
+# computed fields, only selected (and joined for) when asked for; num_upcoming_shows is a counter column
+LISTING_FIELDS = ['num_upcoming_shows']
+DETAIL_FIELDS = ['upcoming_shows_count', 'past_shows_count', 'upcoming_shows', 'past_shows']
+SHOW_JOINED_FIELDS = {
+    'venue_name': (Venue, 'name'),
+    'venue_image_link': (Venue, 'image_link'),
+    'artist_name': (Artist, 'name'),
+    'artist_image_link': (Artist, 'image_link'),
+}
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+def to_json(payload):
+    # orjson when it is installed, the stdlib encoder otherwise; both write datetimes as ISO 8601
+    if orjson is not None:
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload, default=json_default, separators=(',', ':'))
+
+
+def api_response(payload, status=200):
+    return app.response_class(to_json(payload), status=status, mimetype='application/json')
+
+
+def requested_fields(allowed, default=None):
+    # ?fields=id,name, 400 on a field the resource does not have
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    if not fields:
+        return list(default or allowed)
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        abort(400, description='unknown fields: ' + ', '.join(unknown))
+    return list(dict.fromkeys(fields))
+
+
+def select_columns(model, fields, always=('id',)):
+    # {label: column} for the requested plain columns plus those the query itself needs
+    columns = {name: getattr(model, name) for name in always}
+    columns.update((name, getattr(model, name)) for name in fields if name in model.__table__.columns)
+    return columns
+
+
+def project(rows, fields):
+    return [{field: row._mapping[field] for field in fields} for row in rows]
+
+
+def page_payload(page, fields):
+    return {
+        'data': project(page.items, fields),
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'limit': page.limit,
+    }
+
+
+def catalog_list(model, plain_fields):
+    # one keyset page of venues or artists ordered by name, projected to ?fields= and filtered by ?genre=
+    fields = requested_fields(plain_fields + LISTING_FIELDS, plain_fields)
+    columns = select_columns(model, fields, always=('id', 'name'))
+    query = db.session.query(*[column.label(name) for name, column in columns.items()])
+    if 'num_upcoming_shows' in fields:
+        query = query.add_columns(model.upcoming_shows_count.label('num_upcoming_shows'), model.next_show_at)
+    genres = request.args.getlist('genre')
+    if genres:
+        query = query.filter(has_genres(model, genres))
+    page = paginate(query, [model.name, model.id], key=lambda row: (row.name, row.id))
+    if 'num_upcoming_shows' in fields:
+        # as on the HTML listings: the counts hold until the page's next show starts and the rollover runs
+        expire_response_at(min((row.next_show_at for row in page.items if row.next_show_at), default=None))
+    return api_response(page_payload(page, fields))
+
+
+def catalog_detail(model, entity_id, plain_fields, tag, show_fk, counterpart, prefix):
+    # one venue or artist projected to ?fields=; the show sections come from the cached partitions
+    fields = requested_fields(plain_fields + DETAIL_FIELDS, plain_fields)
+    columns = select_columns(model, fields)
+    load_row = db.session.query(*[column.label(name) for name, column in columns.items()]).\
+        filter(model.id == entity_id).\
+        first
+    show_fields = any(field in DETAIL_FIELDS for field in fields)
+    row, shows = show_partitions(tag, show_fk, entity_id, counterpart, prefix, load_row) if show_fields \
+        else (load_row(), None)
+    if row is None:
+        abort(404)
+    data = {field: row._mapping[field] for field in fields if field in columns}
+
+    if show_fields:
+        tile_fields = ['id', 'start_time', prefix + '_id', prefix + '_name', prefix + '_image_link']
+        computed = {
+            'upcoming_shows_count': shows.upcoming_count,
+            'past_shows_count': shows.past_count,
+            'upcoming_shows': project(shows.upcoming, tile_fields),
+            'past_shows': project(shows.past, tile_fields),
         }
-        show_seed.append(show)
+        data.update((field, computed[field]) for field in fields if field in computed)
+    return api_response({'data': {field: data[field] for field in fields}})
+
+
+def catalog_search(model):
+    # the search pages' ranked matches, with their upcoming-show counts
+    total, rows = search_catalog(model, request.args.get('q', ''))
+    return api_response({'count': total, 'data': project(rows, ['id', 'name', 'num_upcoming_shows'])})
+
+
+@api.route('/venues', endpoint='venues')
+@replica_reads
+@cached_view('venues')
+def api_venues():
+    return catalog_list(Venue, VENUE_FIELDS)
+
+
+@api.route('/venues/search', endpoint='search_venues')
+@replica_reads
+def api_search_venues():
+    return catalog_search(Venue)
+
+
+@api.route('/venues/<int:venue_id>', endpoint='venue')
+@replica_reads
+@cached_view('venue:{venue_id}')
+def api_venue(venue_id):
+    return catalog_detail(Venue, venue_id, VENUE_FIELDS, 'venue:{}'.format(venue_id), Show.venue_id, Artist, 'artist')
+
+
+@api.route('/artists', endpoint='artists')
+@replica_reads
+@cached_view('artists')
+def api_artists():
+    return catalog_list(Artist, ARTIST_FIELDS)
+
+
+@api.route('/artists/search', endpoint='search_artists')
+@replica_reads
+def api_search_artists():
+    return catalog_search(Artist)
+
+
+@api.route('/artists/<int:artist_id>', endpoint='artist')
+@replica_reads
+@cached_view('artist:{artist_id}')
+def api_artist(artist_id):
+    return catalog_detail(Artist, artist_id, ARTIST_FIELDS, 'artist:{}'.format(artist_id),
+                          Show.artist_id, Venue, 'venue')
+
+
+def shows_query(fields):
+    # Show columns plus venue/artist columns, joining each side only when one of its fields is asked for
+    columns = select_columns(Show, fields, always=('id', 'start_time'))
+    query = db.session.query(*[column.label(name) for name, column in columns.items()])
+    joined = set()
+    for field in fields:
+        if field in SHOW_JOINED_FIELDS:
+            model, attribute = SHOW_JOINED_FIELDS[field]
+            if model not in joined:
+                query = query.join(model, (Show.venue_id if model is Venue else Show.artist_id) == model.id)
+                joined.add(model)
+            query = query.add_columns(getattr(model, attribute).label(field))
+    return query
+
+
+@api.route('/shows', endpoint='shows')
+@replica_reads
+@cached_view('shows')
+def api_shows():
+    # ?venue_id= / ?artist_id= narrow the listing to one side
+    fields = requested_fields(SHOW_FIELDS + list(SHOW_JOINED_FIELDS), SHOW_FIELDS)
+    query = shows_query(fields)
+    for argument in ('venue_id', 'artist_id'):
+        value = request.args.get(argument, type=int)
+        if value is not None:
+            query = query.filter(getattr(Show, argument) == value)
+    page = paginate(query, [Show.start_time, Show.id], key=lambda show: (show.start_time, show.id))
+    return api_response(page_payload(page, fields))
+
+
+@api.route('/shows/<int:show_id>', endpoint='show')
+@replica_reads
+def api_show(show_id):
+    fields = requested_fields(SHOW_FIELDS + list(SHOW_JOINED_FIELDS), SHOW_FIELDS)
+    row = shows_query(fields).filter(Show.id == show_id).first() or abort(404)
+    return api_response({'data': project([row], fields)[0]})
+
+
+@api.route('/<kind>:bulk', methods=['POST'], endpoint='bulk_import')
+def api_bulk_import(kind):
+    # body: CSV (text/csv), NDJSON (application/x-ndjson) or a JSON array of rows; CSV and NDJSON are streamed
+    if kind not in IMPORT_KINDS:
+        abort(404)
+    format = import_format('', request.mimetype)
+    if format is None:
+        abort(415, description='send text/csv, application/x-ndjson or application/json')
+    try:
+        rows = read_import_rows(io.TextIOWrapper(request.stream, encoding='utf-8', newline=''), format)
+        report = import_rows(kind, rows, app.config['IMPORT_BATCH_SIZE'])
+    except (ValueError, csv.Error) as error:
+        abort(400, description=str(error))
+    return api_response(report)
+
+
+@api.route('/export/<kind>', endpoint='export')
+@replica_reads
+def api_export(kind):
+    # ?format=ndjson (default) or csv; ?since=<ISO 8601> for only the rows changed since then
+    if kind not in IMPORT_KINDS:
+        abort(404)
+    format = request.args.get('format', 'ndjson')
+    if format not in ('ndjson', 'csv'):
+        abort(400, description='format must be ndjson or csv')
+    since = request.args.get('since')
+    try:
+        since = since and datetime.fromisoformat(since)
+    except ValueError:
+        abort(400, description='since must be an ISO 8601 datetime')
+    started_at = datetime.now()
+    response = app.response_class(stream_with_context(export_chunks(kind, format, since)),
+                                  mimetype='application/x-ndjson' if format == 'ndjson' else 'text/csv')
+    response.headers['Content-Disposition'] = 'attachment; filename={}.{}'.format(kind, format)
+    response.headers['X-Export-Started-At'] = started_at.isoformat()
+    # what to pass as ?since= next time to pick up everything changed from now on
+    response.headers['X-Export-Next-Since'] = next_export_since(started_at).isoformat()
+    return response
+
+
+# the codes the app renders HTML pages for are listed too, since code-specific handlers win over class ones
+@api.errorhandler(404)
+@api.errorhandler(500)
+@api.errorhandler(HTTPException)
+def api_error(error):
+    return api_response({'error': error.name, 'message': error.description}, status=error.code)
+
+
+@api.after_request
+def compress_response(response):
+    # brotli (when installed) or gzip, per Accept-Encoding, for bodies big enough to gain from it
+    if response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < app.config['API_COMPRESS_MIN_SIZE']:
+        return response
+    if brotli is not None and request.accept_encodings['br']:
+        response.set_data(brotli.compress(body, quality=app.config['API_BROTLI_QUALITY']))
+        response.headers['Content-Encoding'] = 'br'
+    elif request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=app.config['API_GZIP_LEVEL']))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+app.register_blueprint(api)
 
-        for show in show_seed:
-            g = Show(**show)
-            db.session.add(g)
-            db.session.commit()
 
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
 
+# sample catalog loaded by "flask seed"; shows refer to venues and artists by name
+SEED_VENUES = [{
+    "name": "The Musical Hop",
+    "genres": ["Jazz", "Reggae", "Swing", "Classical", "Folk"],
+    "address": "1015 Folsom Street",
+    "city": "San Francisco",
+    "state": "CA",
+    "phone": "123-123-1234",
+    "website": "https://www.themusicalhop.com",
+    "facebook_link": "https://www.facebook.com/TheMusicalHop",
+    "seeking_talent": True,
+    "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
+    "image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60"
+}, {
+    "name": "The Dueling Pianos Bar",
+    "genres": ["Classical", "R&B", "Hip-Hop"],
+    "address": "335 Delancey Street",
+    "city": "New York",
+    "state": "NY",
+    "phone": "914-003-1132",
+    "website": "https://www.theduelingpianos.com",
+    "facebook_link": "https://www.facebook.com/theduelingpianos",
+    "seeking_talent": False,
+    "image_link": "https://images.unsplash.com/photo-1497032205916-ac775f0649ae?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=750&q=80"
+}, {
+    "name": "Park Square Live Music & Coffee",
+    "genres": ["Rock n Roll", "Jazz", "Classical", "Folk"],
+    "address": "34 Whiskey Moore Ave",
+    "city": "San Francisco",
+    "state": "CA",
+    "phone": "415-000-1234",
+    "website": "https://www.parksquarelivemusicandcoffee.com",
+    "facebook_link": "https://www.facebook.com/ParkSquareLiveMusicAndCoffee",
+    "seeking_talent": False,
+    "image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80"
+}]
+
+SEED_ARTISTS = [{
+    "name": "Guns N Petals",
+    "genres": ["Rock n Roll"],
+    "city": "San Francisco",
+    "state": "CA",
+    "phone": "326-123-5000",
+    "website": "https://www.gunsnpetalsband.com",
+    "facebook_link": "https://www.facebook.com/GunsNPetals",
+    "seeking_venue": True,
+    "seeking_description": "Looking for shows to perform at in the San Francisco Bay Area!",
+    "image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80"
+}, {
+    "name": "Matt Quevedo",
+    "genres": ["Jazz"],
+    "city": "New York",
+    "state": "NY",
+    "phone": "300-400-5000",
+    "facebook_link": "https://www.facebook.com/mattquevedo923251523",
+    "seeking_venue": False,
+    "image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80"
+}, {
+    "name": "The Wild Sax Band",
+    "genres": ["Jazz", "Classical"],
+    "city": "San Francisco",
+    "state": "CA",
+    "phone": "432-325-5432",
+    "seeking_venue": False,
+    "image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80"
+}]
+
+SEED_SHOWS = [
+    {"venue": "The Musical Hop", "artist": "Guns N Petals", "start_time": "2019-05-21T21:30:00.000Z"},
+    {"venue": "Park Square Live Music & Coffee", "artist": "Matt Quevedo", "start_time": "2019-06-15T23:00:00.000Z"},
+    {"venue": "Park Square Live Music & Coffee", "artist": "The Wild Sax Band", "start_time": "2035-04-01T20:00:00.000Z"},
+    {"venue": "Park Square Live Music & Coffee", "artist": "The Wild Sax Band", "start_time": "2035-04-08T20:00:00.000Z"},
+    {"venue": "Park Square Live Music & Coffee", "artist": "The Wild Sax Band", "start_time": "2035-04-15T20:00:00.000Z"},
+]
+
+# (city, state) pairs and name parts for synthetic catalogs
+SYNTHETIC_CITIES = [
+    ("San Francisco", "CA"), ("Los Angeles", "CA"), ("New York", "NY"), ("Brooklyn", "NY"),
+    ("Chicago", "IL"), ("Austin", "TX"), ("Houston", "TX"), ("Seattle", "WA"), ("Portland", "OR"),
+    ("Denver", "CO"), ("Nashville", "TN"), ("New Orleans", "LA"), ("Atlanta", "GA"), ("Boston", "MA"),
+]
+SYNTHETIC_WORDS = [
+    "Blue", "Velvet", "Electric", "Golden", "Midnight", "Silver", "Wild", "Lucky", "Rusty", "Neon",
+    "Hop", "Lounge", "Hall", "Room", "Garden", "Cellar", "Stage", "Band", "Collective", "Trio",
+]
+
+
+def copy_rows(table, rows):
+    # COPY ... FROM STDIN on Postgres (psycopg 3 or psycopg2), one executemany (multi-row INSERT) everywhere else
+    if not rows:
+        return
+    driver = db.engine.dialect.driver
+    if driver not in ('psycopg', 'psycopg2'):
+        db.session.execute(table.insert(), rows)
+        return
+
+    columns = list(rows[0])
+    statement = 'COPY "{}" ({}) FROM STDIN'.format(table.name, ', '.join('"{}"'.format(column) for column in columns))
+    cursor = db.session.connection().connection.cursor()
+    if driver == 'psycopg':
+        # psycopg 3 adapts each value itself, lists to arrays and None to NULL
+        with cursor.copy(statement) as copy:
+            for row in rows:
+                copy.write_row([row[column] for column in columns])
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([pg_array_literal(row[column]) if isinstance(row[column], list) else row[column]
+                         for column in columns])
+    buffer.seek(0)
+    cursor.copy_expert(statement + ' WITH CSV', buffer)
+
+
+def pg_array_literal(values):
+    # '{"Jazz","Rock n Roll"}' for COPY
+    return '{' + ','.join('"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"' for value in values) + '}'
+
+
+def bulk_insert(model, rows, batch_size):
+    # insert an iterable of column dicts in batches, without building ORM objects
+    batch = []
+    count = 0
+    # COPY and executemany skip the Show events, so the shows' venues and artists are recounted before the commit
+    recount = {counted: set() for counted in COUNTED_BY} if model is Show else {}
+    for row in rows:
+        if 'genres' in row:
+            row['search_text'] = search_text(row.get('name'), row.get('city'), row.get('state'),
+                                             genres=row['genres'])
+        for counted, ids in recount.items():
+            ids.add(row[COUNTED_BY[counted].key])
+        batch.append(row)
+        if len(batch) >= batch_size:
+            copy_rows(model.__table__, batch)
+            count += len(batch)
+            batch = []
+    copy_rows(model.__table__, batch)
+    for counted, ids in recount.items():
+        recount_shows(counted, ids, batch_size=batch_size)
+    if model is Show and count + len(batch):
+        bump_change_counter(db.session, 'shows')
+    db.session.commit()
+    return count + len(batch)
+
+
+def uniform_rows(rows):
+    # multi-row inserts need every row to carry the same columns
+    columns = set().union(*rows)
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+
+def seed_sample_data(batch_size):
+    # the sample catalog, for each table that is still empty
+    if db.session.query(Venue.id).first() is None:
+        bulk_insert(Venue, uniform_rows(SEED_VENUES), batch_size)
+    if db.session.query(Artist.id).first() is None:
+        bulk_insert(Artist, uniform_rows(SEED_ARTISTS), batch_size)
+    if db.session.query(Show.id).first() is None:
+        # one lookup per table to turn names into ids
+        venue_ids = dict(db.session.query(Venue.name, Venue.id).
+                         filter(Venue.name.in_([show['venue'] for show in SEED_SHOWS])))
+        artist_ids = dict(db.session.query(Artist.name, Artist.id).
+                          filter(Artist.name.in_([show['artist'] for show in SEED_SHOWS])))
+        bulk_insert(Show, ({
+            "venue_id": venue_ids[show['venue']],
+            "artist_id": artist_ids[show['artist']],
+            "start_time": dateutil.parser.parse(show['start_time']).replace(tzinfo=None)
+        } for show in SEED_SHOWS), batch_size)
+
+
+def synthetic_entities(rng, count, genres, kind):
+    for number in range(count):
+        city, state = rng.choice(SYNTHETIC_CITIES)
+        name = '{} {} {}'.format(rng.choice(SYNTHETIC_WORDS), rng.choice(SYNTHETIC_WORDS), number)
+        row = {
+            "name": name,
+            "city": city,
+            "state": state,
+            "phone": '{:03d}-{:03d}-{:04d}'.format(rng.randrange(1000), rng.randrange(1000), rng.randrange(10000)),
+            "genres": rng.sample(genres, rng.randint(1, 3)),
+        }
+        if kind == 'venue':
+            row.update(address='{} Main Street'.format(number), seeking_talent=rng.random() < 0.3)
+        else:
+            row.update(seeking_venue=rng.random() < 0.3)
+        yield row
+
+
+def synthetic_shows(rng, venue_ids, artist_ids, shows_per_venue):
+    # start times spread over two years in the past and one year ahead
+    now = datetime.now()
+    for venue_id in venue_ids:
+        for _ in range(shows_per_venue):
+            yield {
+                "venue_id": venue_id,
+                "artist_id": rng.choice(artist_ids),
+                "start_time": now + timedelta(minutes=rng.randint(-2 * 365 * 24 * 60, 365 * 24 * 60))
+            }
+
+
+@app.cli.command('seed')
+@click.option('--scale', default=0, show_default=True,
+              help='Also generate this many synthetic venues and as many artists.')
+@click.option('--shows-per-venue', default=10, show_default=True,
+              help='Synthetic shows generated for each synthetic venue.')
+@click.option('--batch-size', default=10000, show_default=True,
+              help='Rows per COPY / multi-row INSERT.')
+@click.option('--random-seed', default=0, show_default=True,
+              help='Seed for the synthetic data generator, for reproducible catalogs.')
+def seed_command(scale, shows_per_venue, batch_size, random_seed):
+    """Load the sample catalog into empty tables, plus an optional synthetic one for load tests."""
+    seed_sample_data(batch_size)
+    if not scale:
+        return
+
+    rng = random.Random(random_seed)
+    genres = [genre for genre, _ in VenueForm.genres.kwargs['choices']]
+    venues_count = bulk_insert(Venue, synthetic_entities(rng, scale, genres, 'venue'), batch_size)
+    artists_count = bulk_insert(Artist, synthetic_entities(rng, scale, genres, 'artist'), batch_size)
+
+    # the ids just handed out by the sequences
+    venue_ids = [venue_id for venue_id, in db.session.query(Venue.id).order_by(Venue.id.desc()).limit(scale)]
+    artist_ids = [artist_id for artist_id, in db.session.query(Artist.id).order_by(Artist.id.desc()).limit(scale)]
+    shows_count = bulk_insert(Show, synthetic_shows(rng, venue_ids, artist_ids, shows_per_venue), batch_size)
+    click.echo('Generated {} venues, {} artists and {} shows.'.format(venues_count, artists_count, shows_count))
+
+
+@app.cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--kind', type=click.Choice(sorted(IMPORT_KINDS)),
+              help='What the file holds; defaults to its name, e.g. shows.csv.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Rows validated and inserted together.')
+def import_command(path, kind, batch_size):
+    """Bulk load venues, artists or shows from a CSV, NDJSON or JSON file.
+
+    Rows are checked with the same rules as the web forms. Shows may refer to
+    their venue and artist by id or by exact name (venue / artist columns).
+    """
+    kind = kind or os.path.basename(path).split('.', 1)[0]
+    format = import_format(path)
+    if kind not in IMPORT_KINDS or format is None:
+        raise click.UsageError('name the file venues|artists|shows.csv|ndjson|json or pass --kind')
+    with open(path, newline='', encoding='utf-8') as stream:
+        try:
+            report = import_rows(kind, read_import_rows(stream, format), batch_size)
+        except (ValueError, csv.Error) as error:
+            raise click.ClickException(str(error))
+    for error in report['errors']:
+        for field, messages in error['errors'].items():
+            click.echo('row {}: {}: {}'.format(error['row'], field, '; '.join(messages)), err=True)
+    click.echo('Imported {} {}, {} errors.'.format(report['inserted'], kind, len(report['errors'])))
+
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(IMPORT_KINDS)))
+@click.option('--format', 'format', type=click.Choice(['ndjson', 'csv']), default='ndjson', show_default=True)
+@click.option('--since', type=click.DateTime(['%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S',
+                                                '%Y-%m-%d']),
+              help='Only rows changed at or after this time, e.g. the time the previous export printed.')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-',
+              help='File to write, stdout by default.')
+def export_command(kind, format, since, output):
+    """Stream venues, artists or shows as NDJSON or CSV, in constant memory."""
+    started_at = datetime.now()
+    for chunk in export_chunks(kind, format, since):
+        output.write(chunk)
+    click.echo('Export started at {}; pass --since {} next time for the rows changed since.'.format(
+        started_at.isoformat(), next_export_since(started_at).isoformat()), err=True)
+
+
+def rollover_show_counters(everything=False, batch_size=1000):
+    """Recount the venues and artists whose next show has started, or all of them with `everything`.
+
+    Their started shows move from the upcoming to the past counter and next_show_at
+    moves on to the following show. Commits every `batch_size` rows and returns
+    {model: rows recounted}. The cache invalidation reaches every worker only
+    with CACHE_TYPE = 'redis'; the in-process caches of other workers rely on
+    their listing entries expiring at next_show_at (see expire_response_at).
+    """
+    now = datetime.now()
+    recounted = {}
+    for model in COUNTED_BY:
+        query = db.session.query(model.id)
+        if not everything:
+            query = query.filter(model.next_show_at < now)
+        ids = [entity_id for entity_id, in query.order_by(model.id)]
+        for start in range(0, len(ids), batch_size):
+            recount_shows(model, ids[start:start + batch_size], now=now, batch_size=batch_size)
+            db.session.commit()
+        recounted[model] = len(ids)
+    # the listings (and the API's num_upcoming_shows) read the counters; the detail pages count shows themselves
+    tags = [tag for model, tag in ((Venue, 'venues'), (Artist, 'artists')) if recounted[model]]
+    if tags:
+        response_cache.invalidate(*tags)
+    return recounted
+
+
+@app.cli.command('rollover')
+@click.option('--all', 'everything', is_flag=True,
+              help='Recount every venue and artist, e.g. after changing shows with plain SQL.')
+@click.option('--every', type=int, default=0,
+              help='Keep running, rolling over every this many seconds.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Venues or artists recounted per transaction.')
+def rollover_command(everything, every, batch_size):
+    """Move shows that have started from the upcoming to the past counters of their venues and artists.
+
+    Schedule it every minute or so (cron, Heroku Scheduler), or keep it running with --every.
+    """
+    while True:
+        recounted = rollover_show_counters(everything, batch_size)
+        click.echo('Recounted {} venues and {} artists.'.format(recounted[Venue], recounted[Artist]))
+        if not every:
+            return
+        time.sleep(every)
 
 
 if not app.debug:
@@ -727,6 +2204,10 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+# compile every template at startup (after all filters are registered) instead of on each worker's first hits
+if app.config['TEMPLATE_PRECOMPILE']:
+    template_instrumentation.precompile()
+
 
 #----------------------------------------------------------------------------#
 # Launch.
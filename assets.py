@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+import click
+from flask import abort, request, send_file, url_for
+from flask.cli import AppGroup
+from werkzeug.security import safe_join
+
+# optional: real minifiers and brotli output; without them CSS gets a conservative built-in pass,
+# JS is only concatenated and only .gz siblings are written
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# bundle name -> source files under static/, in page order
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'main.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+        'js/script.js',
+    ],
+}
+
+# built bundles live next to css/ and js/, so relative url(../fonts/...) references still resolve
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+
+_CSS_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(text):
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    # comments (but not /*! licences */), runs of whitespace, spaces around punctuation, ;}
+    text = _CSS_COMMENT.sub('', text)
+    text = _CSS_SPACE.sub(' ', text)
+    text = _CSS_PUNCTUATION.sub(r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    return rjsmin.jsmin(text) if rjsmin is not None else text
+
+
+def build(static_folder, bundles=BUNDLES):
+    """Concatenate, minify and fingerprint each bundle into static/dist, with .gz/.br siblings.
+
+    Returns the manifest ({bundle name: path under static/}), also written to
+    static/dist/manifest.json. Earlier builds are left in place so pages
+    rendered before a deploy can still load their assets.
+    """
+    dist = os.path.join(static_folder, DIST)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name, sources in bundles.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding='utf-8') as handle:
+                parts.append(handle.read())
+        if name.endswith('.css'):
+            content = minify_css('\n'.join(parts))
+        else:
+            # a ; between files so one ending without a semicolon cannot merge with the next
+            content = minify_js('\n;\n'.join(parts))
+        data = content.encode('utf-8')
+
+        stem, extension = os.path.splitext(name)
+        filename = '{}.{}{}'.format(stem, hashlib.sha256(data).hexdigest()[:12], extension)
+        path = os.path.join(dist, filename)
+        with open(path, 'wb') as handle:
+            handle.write(data)
+        with open(path + '.gz', 'wb') as handle:
+            handle.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as handle:
+                handle.write(brotli.compress(data, quality=11))
+        manifest[name] = DIST + '/' + filename
+
+    with open(os.path.join(dist, MANIFEST), 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets(object):
+    """Serves the built bundles and gives templates asset_url() / asset_urls().
+
+    Without a build (e.g. in development) asset_urls() falls back to the
+    individual source files, so the site works either way.
+    """
+
+    def __init__(self, app=None):
+        self._manifest = None
+        self._manifest_mtime = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.add_url_rule('/static/{}/<path:filename>'.format(DIST), 'dist_asset', self.serve)
+        app.add_template_global(self.asset_url, 'asset_url')
+        app.add_template_global(self.asset_urls, 'asset_urls')
+
+        assets_cli = AppGroup('assets', help='Static asset bundles.')
+
+        @assets_cli.command('build')
+        def build_command():
+            """Concatenate, minify and fingerprint the CSS/JS bundles, with precompressed copies."""
+            for name, path in sorted(build(app.static_folder).items()):
+                click.echo('{} -> static/{}'.format(name, path))
+
+        app.cli.add_command(assets_cli)
+
+    def manifest(self):
+        # re-read when a build replaces it, so a running development server picks it up
+        path = os.path.join(self.app.static_folder, DIST, MANIFEST)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return {}
+        if mtime != self._manifest_mtime:
+            with open(path) as handle:
+                self._manifest = json.load(handle)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def asset_url(self, name):
+        """URL of the built, fingerprinted bundle `name`, or None if it has not been built."""
+        path = self.manifest().get(name)
+        return url_for('static', filename=path) if path else None
+
+    def asset_urls(self, name):
+        url = self.asset_url(name)
+        if url is not None:
+            return [url]
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def serve(self, filename):
+        # fingerprinted files never change: cache them for a year, brotli/gzip copies when accepted
+        path = safe_join(os.path.join(self.app.static_folder, DIST), filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, candidate
+                break
+        response = send_file(path, mimetype=mimetype, max_age=365 * 24 * 3600)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
@@ -0,0 +1,75 @@
+"""p50/p99 latency of the venue and artist pages, with their queries run in turn vs concurrently.
+
+Runs against the database configured in config.py (Postgres, or SQLite via
+DATABASE_URL as a stand-in) with the response cache off, adding --latency-ms
+to every statement to simulate the round trip to a remote database:
+
+    python benchmarks/detail_latency.py --scale 1000 --latency-ms 5
+
+--scale seeds a synthetic catalog first (see "flask seed").
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ['CACHE_TYPE'] = 'null'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=0, help='seed this many synthetic venues and artists first')
+    parser.add_argument('--latency-ms', type=float, default=5, help='simulated round trip added to each statement')
+    parser.add_argument('--requests', type=int, default=200, help='page loads per mode')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('DETAIL_QUERY_WORKERS') or 4),
+                        help='DETAIL_QUERY_WORKERS for the concurrent mode')
+    args = parser.parse_args()
+
+    # the app sizes its query pool from DETAIL_QUERY_WORKERS as it is imported
+    os.environ['DETAIL_QUERY_WORKERS'] = str(args.workers)
+    from app import app, db, Artist, Venue
+
+    if args.scale:
+        result = app.test_cli_runner().invoke(args=['seed', '--scale', str(args.scale)])
+        print(result.output.strip())
+    with app.app_context():
+        venue_ids = [venue_id for venue_id, in db.session.query(Venue.id).order_by(Venue.id).limit(100)]
+        artist_ids = [artist_id for artist_id, in db.session.query(Artist.id).order_by(Artist.id).limit(100)]
+    if not venue_ids or not artist_ids:
+        sys.exit('no venues or artists: run "flask seed" or pass --scale')
+    urls = ['/venues/{}'.format(venue_id) for venue_id in venue_ids] + \
+        ['/artists/{}'.format(artist_id) for artist_id in artist_ids]
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def simulate_latency(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(args.latency_ms / 1000)
+
+    client = app.test_client()
+    print('{} ms simulated latency per statement, {} requests per mode, {} query threads'.format(
+        args.latency_ms, args.requests, args.workers))
+    print('{:<12} {:>10} {:>10} {:>10}'.format('mode', 'p50 ms', 'p99 ms', 'mean ms'))
+    for mode, workers in [('sequential', 0), ('concurrent', args.workers)]:
+        app.config['DETAIL_QUERY_WORKERS'] = workers
+        client.get(urls[0])
+        samples = []
+        for number in range(args.requests):
+            started = time.perf_counter()
+            response = client.get(urls[number % len(urls)])
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.status_code
+        print('{:<12} {:>10.1f} {:>10.1f} {:>10.1f}'.format(mode, percentile(samples, 0.5), percentile(samples, 0.99),
+                                                         statistics.mean(samples)))
+
+
+if __name__ == '__main__':
+    main()
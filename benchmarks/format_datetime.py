@@ -0,0 +1,88 @@
+"""Render pages/shows.html with 10k shows using the old and the current datetime formatting.
+
+The old path formatted every start time in the view (str() -> dateutil parse ->
+babel) and then parsed and formatted that string again in the template filter.
+No database is needed:
+
+    python benchmarks/format_datetime.py --shows 10000 --distinct 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template  # noqa: E402
+from app import app, format_datetime, format_datetime_cached  # noqa: E402
+
+ShowRow = namedtuple('ShowRow', ['id', 'venue_id', 'venue_name', 'artist_id', 'artist_name',
+                                 'artist_image_link', 'start_time'])
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor', 'limit'])
+
+
+def legacy_format_datetime(value, format='medium'):
+    # the filter as it was: parse a string, rebuild the babel pattern on every call
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def make_shows(count, distinct):
+    start = datetime(2030, 1, 1, 20, 0)
+    return [ShowRow(number, 1, 'Venue', 1, 'Artist', 'https://example.com/a.jpg',
+                    start + timedelta(hours=number % distinct))
+            for number in range(count)]
+
+
+def render_legacy(shows):
+    # view pre-formats each start time, the template filter re-parses and formats it again
+    app.jinja_env.filters['datetime'] = legacy_format_datetime
+    try:
+        rows = [show._replace(start_time=legacy_format_datetime(str(show.start_time))) for show in shows]
+        return render_template('pages/shows.html', shows=rows, page=Page(rows, None, None, len(rows)))
+    finally:
+        app.jinja_env.filters['datetime'] = format_datetime
+
+
+def render_current(shows):
+    format_datetime_cached.cache_clear()
+    return render_template('pages/shows.html', shows=shows, page=Page(shows, None, None, len(shows)))
+
+
+def best_of(function, shows, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(shows)
+        samples.append((time.perf_counter() - started) * 1000)
+    return min(samples), statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', type=int, default=10000)
+    parser.add_argument('--distinct', type=int, default=500, help='distinct start times among the shows')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    shows = make_shows(args.shows, args.distinct)
+    with app.test_request_context('/shows'):
+        assert legacy_format_datetime(str(shows[0].start_time), 'full') == format_datetime(shows[0].start_time, 'full')
+        print('{} shows, {} distinct start times, best/median of {}'.format(args.shows, args.distinct, args.repeat))
+        for label, function in (('legacy', render_legacy), ('current', render_current)):
+            best, median = best_of(function, shows, args.repeat)
+            print('{:<8} {:>10.1f} ms {:>10.1f} ms'.format(label, best, median))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""Throughput, p50/p95/p99 latency and SQL statements per request of every page, checked against a baseline.
+
+Drives each route in turn with --concurrency client threads, in process through the
+app's test client or against a running server with --url. SQL statement counts come
+from the Server-Timing header the app adds to every response. A route's count is the
+most any of its requests ran, warm-up included: that of a response cache miss rather
+than of the hits most requests are, so a server given with --url must start with an
+empty cache. The POST routes create and edit rows, so the run never touches
+DATABASE_URL: it uses LOAD_TEST_DATABASE_URL when set (the scratch database of the
+server given with --url, which requires it) and otherwise a temporary SQLite
+database, created here and deleted afterwards:
+
+    python benchmarks/load.py --scale 1000 --save-baseline    # record benchmarks/baseline.json
+    python benchmarks/load.py --scale 1000                    # compare, exit status 1 on a regression
+
+--scale seeds a synthetic catalog first (see "flask seed") unless the database
+already holds that many venues. A route regresses when it runs more SQL statements
+or fails more requests than the baseline recorded, and, when the baseline was
+recorded on this host against the same kind of database with the same settings,
+when its p95 is more than --tolerance above the baseline's (and at least
+--min-delta-ms slower) or its throughput is more than --tolerance below (and each
+request takes at least --min-delta-ms longer). A missing baseline is an error.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from urllib.parse import urlencode
+
+# the database is chosen before the app is imported: it connects to DATABASE_URL as it loads
+SCRATCH_DIR = None
+if os.environ.get('LOAD_TEST_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['LOAD_TEST_DATABASE_URL']
+else:
+    SCRATCH_DIR = tempfile.mkdtemp(prefix='fyyur-loadtest-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(SCRATCH_DIR, 'fyyur.db')
+os.environ.pop('DATABASE_REPLICA_URLS', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Artist, Venue  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+VENUE_FORM = {
+    'name': 'Load Test Hall', 'city': 'San Francisco', 'state': 'CA', 'address': '1 Load Test Way',
+    'phone': '415-555-0100', 'genres': ['Jazz', 'Folk'], 'website': 'https://example.com',
+    'facebook_link': 'https://www.facebook.com/loadtest', 'image_link': 'https://example.com/hall.jpg',
+    'seeking_talent': 'y', 'seeking_description': 'Load test',
+}
+ARTIST_FORM = {
+    'name': 'The Load Testers', 'city': 'San Francisco', 'state': 'CA', 'phone': '415-555-0101',
+    'genres': ['Rock n Roll'], 'website': 'https://example.com', 'facebook_link': 'https://www.facebook.com/loadtest',
+    'image_link': 'https://example.com/band.jpg', 'seeking_venue': 'y', 'seeking_description': 'Load test',
+}
+
+
+def edit_form(model, form, entity_id, number):
+    # an edit that keeps the entity's name and details but always changes something, so every POST updates the row
+    entity = db.session.get(model, entity_id)
+    data = {field: getattr(entity, field) for field in form if field != 'seeking_description' and
+            getattr(entity, field, None) is not None}
+    data.update(genres=entity.genres or form['genres'], seeking_description='Load test edit {}'.format(number))
+    for flag in ('seeking_talent', 'seeking_venue'):
+        if flag in data:
+            data[flag] = 'y' if data[flag] else ''
+    return data
+
+
+def routes(venue_ids, artist_ids, search_term):
+    """(name, method, path(n), form data(n) or None) for the n-th request of each route.
+
+    Reads rotate over the sampled ids, so the detail pages are not all served by one cache entry;
+    each edit POST goes to a different row while there are more rows than requests.
+    """
+    def venue(number):
+        return venue_ids[number % len(venue_ids)]
+
+    def artist(number):
+        return artist_ids[number % len(artist_ids)]
+
+    def show_form(number):
+        return {'venue_id': venue(number), 'artist_id': artist(number), 'start_time': '2035-06-01 20:00:00'}
+
+    return [
+        ('home', 'GET', lambda n: '/', None),
+        ('venues', 'GET', lambda n: '/venues', None),
+        ('search venues', 'POST', lambda n: '/venues/search', lambda n: {'search_term': search_term}),
+        ('venue', 'GET', lambda n: '/venues/{}'.format(venue(n)), None),
+        ('venue edit form', 'GET', lambda n: '/venues/{}/edit'.format(venue(n)), None),
+        ('venue create form', 'GET', lambda n: '/venues/create', None),
+        ('create venue', 'POST', lambda n: '/venues/create', lambda n: VENUE_FORM),
+        ('edit venue', 'POST', lambda n: '/venues/{}/edit'.format(venue(n)),
+         lambda n: edit_form(Venue, VENUE_FORM, venue(n), n)),
+        ('artists', 'GET', lambda n: '/artists', None),
+        ('search artists', 'POST', lambda n: '/artists/search', lambda n: {'search_term': search_term}),
+        ('artist', 'GET', lambda n: '/artists/{}'.format(artist(n)), None),
+        ('artist edit form', 'GET', lambda n: '/artists/{}/edit'.format(artist(n)), None),
+        ('artist create form', 'GET', lambda n: '/artists/create', None),
+        ('create artist', 'POST', lambda n: '/artists/create', lambda n: ARTIST_FORM),
+        ('edit artist', 'POST', lambda n: '/artists/{}/edit'.format(artist(n)),
+         lambda n: edit_form(Artist, ARTIST_FORM, artist(n), n)),
+        ('shows', 'GET', lambda n: '/shows', None),
+        ('show create form', 'GET', lambda n: '/shows/create', None),
+        ('create show', 'POST', lambda n: '/shows/create', show_form),
+    ]
+
+
+def in_process_client():
+    # one test client per thread; returns send(method, path, data) -> (status, Server-Timing values)
+    local = threading.local()
+
+    def send(method, path, data):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        response = local.client.open(path, method=method, data=data)
+        response.get_data()
+        return response.status_code, response.headers.get_all('Server-Timing')
+    return send
+
+
+def http_client(base_url):
+    def send(method, path, data):
+        body = urlencode(data, doseq=True).encode() if data is not None else None
+        request = urllib.request.Request(base_url.rstrip('/') + path, data=body, method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status, response.headers.get_all('Server-Timing') or []
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers.get_all('Server-Timing') or []
+    return send
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def drive(send, method, path, data, requests, concurrency):
+    """Send `requests` requests from `concurrency` threads; returns the route's metrics."""
+    numbers = count()
+    # form data reads the database, so it is built up front rather than inside the timed loop
+    with app.app_context():
+        forms = [data(number) if data else None for number in range(requests)]
+
+    def worker():
+        samples = []
+        while True:
+            number = next(numbers)
+            if number >= requests:
+                return samples
+            started = time.perf_counter()
+            status, timings = send(method, path(number), forms[number])
+            elapsed = time.perf_counter() - started
+            queries = _QUERIES.search(', '.join(timings))
+            samples.append((elapsed * 1000, status, int(queries.group(1)) if queries else None))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(worker) for _ in range(concurrency)]
+        samples = [sample for future in futures for sample in future.result()]
+    wall = time.perf_counter() - started
+
+    latencies = [ms for ms, status, queries in samples]
+    queries = [queries for ms, status, queries in samples if queries is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for ms, status, queries in samples if status >= 400),
+        'rps': round(len(samples) / wall, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        # the cache misses' count: a hit runs only the ETag lookup, or nothing
+        'queries': max(queries) if queries else None,
+    }
+
+
+def regressions(results, baseline, tolerance, min_delta_ms, timings=True):
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if timings and result['p95_ms'] > before['p95_ms'] * (1 + tolerance) and \
+                result['p95_ms'] - before['p95_ms'] >= min_delta_ms:
+            found.append('{}: p95 {} ms, baseline {} ms'.format(name, result['p95_ms'], before['p95_ms']))
+        # wall time per request (1000 / rps) must grow by min_delta_ms too, so tiny pages' jitter is not a regression
+        if timings and result['rps'] < before['rps'] * (1 - tolerance) and \
+                1000 / result['rps'] - 1000 / before['rps'] >= min_delta_ms:
+            found.append('{}: {} req/s, baseline {} req/s'.format(name, result['rps'], before['rps']))
+        if result['queries'] is not None and before['queries'] is not None and result['queries'] > before['queries']:
+            found.append('{}: {} SQL statements, baseline {}'.format(name, result['queries'], before['queries']))
+        if result['errors'] > before['errors']:
+            found.append('{}: {} failed requests, baseline {}'.format(name, result['errors'], before['errors']))
+    return found
+
+
+def run(args):
+    with app.app_context():
+        if SCRATCH_DIR:
+            db.create_all(bind_key=None)
+        if args.scale and db.session.query(db.func.count(Venue.id)).scalar() < args.scale:
+            result = app.test_cli_runner().invoke(args=['seed', '--scale', str(args.scale)])
+            print(result.output.strip())
+        # one row per request where the catalog is big enough
+        sample = max(args.requests, 100)
+        venue_ids = [venue_id for venue_id, in db.session.query(Venue.id).order_by(Venue.id).limit(sample)]
+        artist_ids = [artist_id for artist_id, in db.session.query(Artist.id).order_by(Artist.id).limit(sample)]
+        search_term = (db.session.query(Venue.city).order_by(Venue.id).limit(1).scalar() or 'a')[:3]
+        database = db.engine.url.get_backend_name()
+    if not venue_ids or not artist_ids:
+        sys.exit('no venues or artists: run "flask seed" or pass --scale')
+
+    # the test client cannot fetch CSRF tokens; a server given with --url must run with WTF_CSRF_ENABLED off
+    app.config['WTF_CSRF_ENABLED'] = False
+    send = http_client(args.url) if args.url else in_process_client()
+    settings = {'requests': args.requests, 'concurrency': args.concurrency, 'target': 'http' if args.url else 'app',
+                'database': database, 'host': platform.node()}
+    results = {}
+    print('{:<20} {:>9} {:>9} {:>9} {:>9} {:>8} {:>7}'.format('route', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms',
+                                                             'queries', 'errors'))
+    for name, method, path, data in routes(venue_ids, artist_ids, search_term):
+        if args.route and name not in args.route:
+            continue
+        warmup = drive(send, method, path, data, args.warmup, 1) if args.warmup else {'queries': None}
+        result = results[name] = drive(send, method, path, data, args.requests, args.concurrency)
+        # the first request of a route (normally a warm-up one) is its cache miss
+        if warmup['queries'] is not None:
+            result['queries'] = max(result['queries'] or 0, warmup['queries'])
+        print('{:<20} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>8} {:>7}'.format(
+            name, result['rps'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+            '-' if result['queries'] is None else result['queries'], result['errors']))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as handle:
+            json.dump({'settings': settings, 'routes': results}, handle, indent=2, sort_keys=True)
+            handle.write('\n')
+        print('baseline saved to {}'.format(args.baseline))
+        return
+    if not os.path.exists(args.baseline):
+        sys.exit('no baseline at {}: record one with --save-baseline'.format(args.baseline))
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    # timings only compare with a run on the same host, database and settings; SQL counts and errors always do
+    timings = baseline.get('settings') == settings
+    if not timings:
+        print('baseline was recorded with {}: comparing SQL statements and errors only'.format(baseline.get('settings')))
+    found = regressions(results, baseline['routes'], args.tolerance, args.min_delta_ms, timings)
+    for line in found:
+        print('REGRESSION ' + line)
+    if found:
+        sys.exit(1)
+    print('no regressions against {}'.format(args.baseline))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=0, help='seed this many synthetic venues and artists first')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed requests per route first')
+    parser.add_argument('--route', action='append', help='only these routes (by name, repeatable)')
+    parser.add_argument('--url', help='load a running server (e.g. http://127.0.0.1:5000) instead of the app in '
+                                      'process; its database must be LOAD_TEST_DATABASE_URL')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline JSON to compare with or save to')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative p95/throughput change')
+    parser.add_argument('--min-delta-ms', type=float, default=10.0,
+                        help='ignore p95 and per-request time increases smaller than this')
+    args = parser.parse_args()
+
+    try:
+        if args.url and SCRATCH_DIR:
+            sys.exit('--url needs LOAD_TEST_DATABASE_URL: the scratch database the server at {} uses'.format(args.url))
+        run(args)
+    finally:
+        if SCRATCH_DIR:
+            with app.app_context():
+                db.engine.dispose()
+            shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""EXPLAIN plans and timings for the Show queries, without and with the Show indexes.
+
+Runs against the database configured in config.py:
+
+    python benchmarks/show_indexes.py --scale 100000
+
+--scale seeds a synthetic catalog first (see "flask seed"). The "before" numbers
+are taken inside a transaction that drops the indexes and is rolled back
+afterwards (indexes missing after that are recreated from the model), so the
+schema is left as declared.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Show  # noqa: E402
+
+INDEXES = ['ix_Show_venue_id_start_time', 'ix_Show_artist_id_start_time', 'ix_Show_start_time']
+
+# the shapes of the queries the venue, artist and shows pages run
+QUERIES = [
+    ('venue upcoming count',
+     'SELECT count(*) FROM "Show" WHERE venue_id = :venue_id AND start_time >= :now'),
+    ('artist past shows',
+     'SELECT id, start_time FROM "Show" WHERE artist_id = :artist_id AND start_time < :now '
+     'ORDER BY start_time DESC, id DESC LIMIT 12'),
+    ('shows page',
+     'SELECT id, start_time FROM "Show" WHERE start_time >= :now ORDER BY start_time, id LIMIT 50'),
+    ('upcoming shows count',
+     'SELECT count(*) FROM "Show" WHERE start_time >= :now'),
+]
+
+
+def statement(sql):
+    return db.text(sql).bindparams(db.bindparam('now', type_=db.DateTime))
+
+
+def explain(connection, sql, params):
+    if connection.dialect.name == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) '
+    else:
+        prefix = 'EXPLAIN QUERY PLAN '
+    return [' | '.join(str(column) for column in row) for row in connection.execute(statement(prefix + sql), params)]
+
+
+def timing(connection, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.execute(statement(sql), params).all()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def measure(connection, params, repeat):
+    results = {}
+    for name, sql in QUERIES:
+        results[name] = (explain(connection, sql, params), timing(connection, sql, params, repeat))
+    return results
+
+
+def report(label, results):
+    print('=' * 78)
+    print(label)
+    print('=' * 78)
+    for name, (plan, median_ms) in results.items():
+        print('-- {} (median {:.3f} ms)'.format(name, median_ms))
+        for line in plan:
+            print('   ' + line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=0, help='seed this many synthetic venues and artists first')
+    parser.add_argument('--repeat', type=int, default=20, help='executions per query for the median timing')
+    args = parser.parse_args()
+
+    if args.scale:
+        result = app.test_cli_runner().invoke(args=['seed', '--scale', str(args.scale)])
+        print(result.output.strip())
+
+    with app.app_context():
+        # the busiest venue and artist, so the filtered queries have rows to walk
+        venue_id = db.session.query(Show.venue_id).group_by(Show.venue_id).\
+            order_by(db.func.count().desc()).limit(1).scalar()
+        artist_id = db.session.query(Show.artist_id).group_by(Show.artist_id).\
+            order_by(db.func.count().desc()).limit(1).scalar()
+        shows_count = db.session.query(db.func.count(Show.id)).scalar()
+        db.session.close()
+        params = {'venue_id': venue_id, 'artist_id': artist_id, 'now': datetime.now()}
+        print('{} shows; venue {}, artist {}'.format(shows_count, venue_id, artist_id))
+
+        with db.engine.connect() as connection:
+            transaction = connection.begin()
+            for index in INDEXES:
+                connection.execute(db.text('DROP INDEX IF EXISTS "{}"'.format(index)))
+            if connection.dialect.name == 'postgresql':
+                connection.execute(db.text('ANALYZE "Show"'))
+            before = measure(connection, params, args.repeat)
+            transaction.rollback()
+            # pysqlite commits DDL on its own instead of rolling it back, so put the indexes back explicitly
+            for index in Show.__table__.indexes:
+                index.create(connection, checkfirst=True)
+            connection.commit()
+
+            if connection.dialect.name == 'postgresql':
+                connection.execute(db.text('ANALYZE "Show"'))
+            after = measure(connection, params, args.repeat)
+            connection.rollback()
+
+    report('without Show indexes', before)
+    report('with Show indexes', after)
+    print('=' * 78)
+    for name, _ in QUERIES:
+        print('{:<24} {:>10.3f} ms -> {:>10.3f} ms'.format(name, before[name][1], after[name][1]))
+
+
+if __name__ == '__main__':
+    main()
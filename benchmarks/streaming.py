@@ -0,0 +1,101 @@
+"""Time to first byte and peak RSS of the whole shows listing, rendered to a string vs streamed.
+
+Runs against the database configured in config.py:
+
+    python benchmarks/streaming.py --scale 10000
+
+--scale seeds a synthetic catalog first (see "flask seed"; 10000 venues with the
+default 10 shows each is 100k shows). Each mode runs in its own process so its
+peak RSS is not inflated by the other one.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template  # noqa: E402
+from app import app, db, Artist, Show, Venue  # noqa: E402
+
+MODES = ['buffered', 'stream']
+
+
+def peak_rss_kb():
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_buffered():
+    # what /shows did for a full listing: load every row, render the page to a string, then send it
+    started = time.perf_counter()
+    with app.test_request_context('/shows'):
+        rows = db.session.query(
+            Show.id,
+            Show.venue_id,
+            Venue.name.label('venue_name'),
+            Show.artist_id,
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link'),
+            Show.start_time
+        ).join(Venue, Show.venue_id == Venue.id).\
+            join(Artist, Show.artist_id == Artist.id).\
+            order_by(Show.start_time, Show.id).\
+            all()
+        body = render_template('pages/shows.html', shows=rows)
+    elapsed = time.perf_counter() - started
+    return {'rows': len(rows), 'bytes': len(body.encode()), 'ttfb_ms': elapsed * 1000, 'total_ms': elapsed * 1000}
+
+
+def run_stream():
+    started = time.perf_counter()
+    response = app.test_client().get('/shows?stream=1', buffered=False)
+    chunks = iter(response.response)
+    size = len(next(chunks))
+    ttfb = time.perf_counter() - started
+    for chunk in chunks:
+        size += len(chunk)
+    response.close()
+    total = time.perf_counter() - started
+    return {'bytes': size, 'ttfb_ms': ttfb * 1000, 'total_ms': total * 1000}
+
+
+def child(mode):
+    baseline = peak_rss_kb()
+    result = run_buffered() if mode == 'buffered' else run_stream()
+    result.update(mode=mode, baseline_rss_kb=baseline, peak_rss_kb=peak_rss_kb())
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=0, help='seed this many synthetic venues and artists first')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        child(args.mode)
+        return
+
+    if args.scale:
+        result = app.test_cli_runner().invoke(args=['seed', '--scale', str(args.scale)])
+        print(result.output.strip())
+    with app.app_context():
+        print('{} shows'.format(db.session.query(db.func.count(Show.id)).scalar()))
+
+    print('{:<10} {:>12} {:>12} {:>14} {:>14}'.format('mode', 'TTFB ms', 'total ms', 'peak RSS MB', 'RSS growth MB'))
+    for mode in MODES:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', mode],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print('{:<10} {:>12.1f} {:>12.1f} {:>14.1f} {:>14.1f}'.format(
+            mode, result['ttfb_ms'], result['total_ms'], result['peak_rss_kb'] / 1024,
+            (result['peak_rss_kb'] - result['baseline_rss_kb']) / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+
+
+class NullCache(object):
+    """Backend that stores nothing; every lookup is a miss."""
+
+    def get_many(self, keys):
+        return [None] * len(keys)
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUCache(object):
+    """In-process cache: least recently used entries are evicted past `max_entries`.
+
+    `timeout` is in seconds; 0 keeps an entry until it is evicted or deleted.
+    """
+
+    def __init__(self, max_entries=1024, default_timeout=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, keys):
+        now = self._clock()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    values.append(None)
+                elif entry[1] is not None and entry[1] <= now:
+                    del self._entries[key]
+                    values.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    values.append(entry[0])
+        return values
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        expires = self._clock() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache(object):
+    """Backend over any Redis-compatible client (redis-py, or a stand-in such as fakeredis in tests)."""
+
+    def __init__(self, client, prefix='fyyur:', default_timeout=300):
+        self.client = client
+        self.prefix = prefix
+        self.default_timeout = default_timeout
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_TYPE = "redis" needs the redis package (pip install redis)')
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [None if value is None else pickle.loads(value)
+                for value in self.client.mget([self.prefix + key for key in keys])]
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        # milliseconds, so a fractional timeout is neither rounded up past its deadline nor down to 0 (no expiry)
+        self.client.set(self.prefix + key, pickle.dumps(value), px=max(int(timeout * 1000), 1) if timeout else None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class TaggedCache(object):
+    """Cache with tag-based invalidation and hit/miss counters.
+
+    Every tag has a version token stored in the backend and each entry key embeds
+    the current tokens of its tags, so invalidating a tag (giving it a fresh
+    token) orphans exactly the entries that depend on it, on every worker
+    sharing the backend. Orphaned entries age out through the backend's own
+    TTL/LRU. Tokens are random rather than counters so a token lost to eviction
+    can never come back and revive stale entries; they also carry the time of
+    the invalidation that created them (see invalidated_at).
+    """
+
+    def __init__(self, backend, clock=time.time):
+        self.backend = backend
+        self._clock = clock
+        self._stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self._lock = threading.Lock()
+
+    def _versioned_key(self, key, tags):
+        tag_keys = ['tag:' + tag for tag in tags]
+        tokens = self.backend.get_many(tag_keys)
+        for index, token in enumerate(tokens):
+            if token is None:
+                tokens[index] = self._new_token(tag_keys[index])
+        return key + '|' + ','.join(tokens)
+
+    def _new_token(self, tag_key, invalidated_at=0):
+        token = '{}.{:d}'.format(uuid.uuid4().hex[:12], int(invalidated_at))
+        self.backend.set(tag_key, token, timeout=0)
+        return token
+
+    def _count(self, name, outcome):
+        with self._lock:
+            self._stats[name][outcome] += 1
+
+    def lookup(self, key, tags=(), name='default'):
+        """Return (entry_key, value); store a freshly computed value under that same entry_key.
+
+        Resolving the tag tokens before the value is computed means an invalidation
+        that lands while it is being computed leaves it stored under the old tokens,
+        where nothing will read it.
+        """
+        entry_key = self._versioned_key(key, tags)
+        value = self.backend.get(entry_key)
+        self._count(name, 'misses' if value is None else 'hits')
+        return entry_key, value
+
+    def store(self, entry_key, value, timeout=None):
+        self.backend.set(entry_key, value, timeout=timeout)
+
+    def invalidate(self, *tags):
+        now = self._clock()
+        for tag in tags:
+            self._new_token('tag:' + tag, invalidated_at=now)
+
+    def invalidated_at(self, entry_key):
+        """When the most recently invalidated tag of a lookup's entry_key was invalidated (0 if never)."""
+        tokens = entry_key.rsplit('|', 1)[1]
+        return max((int(token.rsplit('.', 1)[1]) for token in tokens.split(',') if token), default=0)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            by_name = {name: dict(counts) for name, counts in self._stats.items()}
+        hits = sum(counts['hits'] for counts in by_name.values())
+        misses = sum(counts['misses'] for counts in by_name.values())
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else None,
+            'by_name': by_name,
+        }
+
+
+def make_backend(config):
+    # cache backend from the CACHE_* settings
+    cache_type = config.get('CACHE_TYPE', 'simple')
+    timeout = config.get('CACHE_DEFAULT_TIMEOUT', 300)
+    if cache_type == 'null':
+        return NullCache()
+    if cache_type == 'redis':
+        return RedisCache.from_url(config['CACHE_REDIS_URL'], prefix=config.get('CACHE_KEY_PREFIX', 'fyyur:'),
+                                   default_timeout=timeout)
+    if cache_type == 'simple':
+        return LRUCache(max_entries=config.get('CACHE_MAX_ENTRIES', 1024), default_timeout=timeout)
+    raise ValueError('unknown CACHE_TYPE {!r}'.format(cache_type))
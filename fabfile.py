@@ -6,8 +6,10 @@ from fabric.contrib.console import confirm
 
 def test():
     with settings(warn_only=True):
+        # check it compiles, passes the tests and that no page got slower or runs more SQL than
+        # benchmarks/baseline.json; both run on temporary SQLite databases (or LOAD_TEST_DATABASE_URL), never DATABASE_URL
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m compileall -q . && python -m pytest -q && python benchmarks/load.py --scale 1000"
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
@@ -39,8 +41,9 @@ def heroku():
 
 
 def heroku_test():
+    # the deployed app imports with its production config (the load test would write to the live database)
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "heroku run python -c 'import app'"
     )
 
 
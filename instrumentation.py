@@ -0,0 +1,141 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('fyyur.sql')
+
+_PLACEHOLDERS = re.compile(r"%\(\w+\)s|:\w+|\$\d+|\?|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r'\?(?:\s*,\s*\?)+')
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """The shape of a statement: parameters and literals as ?, IN lists as one ?, whitespace collapsed."""
+    shape = _PLACEHOLDERS.sub('?', statement)
+    shape = _LISTS.sub('?', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode when a request runs more queries, or repeats a statement more often, than allowed."""
+
+
+class QueryStats(object):
+    """Queries run while handling one request, including those it runs on the query pool's threads."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement, seconds):
+        shape = fingerprint(statement)
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.shapes[shape] += 1
+
+    def repeated(self, more_than):
+        """[(shape, count)] of the statements run more than `more_than` times, most repeated first."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > more_than]
+
+
+def query_budget(max_queries=None, max_repeats=None):
+    """Override SQL_QUERY_BUDGET / SQL_MAX_REPEATS for one view (put it right under the route)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            g.sql_budget = (max_queries, max_repeats)
+            return view(**view_args)
+        return wrapper
+    return decorator
+
+
+def current_query_stats():
+    # any app context: query pool threads share their request's stats through their own g
+    return g.get('sql_stats') if has_app_context() else None
+
+
+class SQLInstrumentation(object):
+    """Per-request SQL statistics from the cursor execute events of every engine.
+
+    Adds a Server-Timing entry and logs one JSON line per request (logger
+    'fyyur.sql'). Statements repeated more than SQL_MAX_REPEATS times are the
+    N+1 candidates; with SQL_STRICT on (tests) a request over SQL_QUERY_BUDGET
+    queries or over SQL_MAX_REPEATS repeats raises QueryBudgetExceeded.
+    Queries run while a streamed response is being sent are not counted.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        if not app.config.get('SQL_INSTRUMENTATION', True):
+            return
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(Engine, 'handle_error', self._handle_error)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        stats = current_query_stats()
+        if stats is not None:
+            stats.record(statement, time.perf_counter() - started)
+
+    def _handle_error(self, exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('query_started'):
+            connection.info['query_started'].pop()
+
+    def _start_request(self):
+        g.sql_stats = QueryStats()
+        g.pop('sql_budget', None)
+
+    def _finish_request(self, response):
+        stats = g.get('sql_stats')
+        if stats is None:
+            return response
+        config = self.app.config
+        max_queries, max_repeats = g.get('sql_budget', (None, None))
+        max_queries = config['SQL_QUERY_BUDGET'] if max_queries is None else max_queries
+        max_repeats = config['SQL_MAX_REPEATS'] if max_repeats is None else max_repeats
+        repeated = stats.repeated(max_repeats)
+
+        response.headers.add('Server-Timing', 'db;dur={:.2f};desc="{} queries"'.format(stats.seconds * 1000,
+                                                                                       stats.count))
+        logger.log(logging.WARNING if repeated else logging.INFO, json.dumps({
+            'event': 'sql',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.seconds * 1000, 3),
+            'repeated': [{'statement': shape, 'count': count} for shape, count in repeated],
+        }))
+
+        if config['SQL_STRICT']:
+            if stats.count > max_queries:
+                raise QueryBudgetExceeded('{} ran {} queries, budget {}'.format(request.endpoint, stats.count,
+                                                                                max_queries))
+            if repeated:
+                shape, count = repeated[0]
+                raise QueryBudgetExceeded('{} ran the same statement {} times (max {}): {}'.format(
+                    request.endpoint, count, max_repeats, shape))
+        return response
@@ -0,0 +1,33 @@
+"""updated_at and version columns on Venue, Artist and Show
+
+Revision ID: 3d6b2f8e4a17
+Revises: b8e1f4a6c902
+Create Date: 2026-10-18 21:02:44.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d6b2f8e4a17'
+down_revision = 'b8e1f4a6c902'
+branch_labels = None
+depends_on = None
+
+TABLES = ['Venue', 'Artist', 'Show']
+
+
+def upgrade():
+    # existing rows start at version 1, last changed now
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        op.create_index('ix_{}_updated_at'.format(table), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_index('ix_{}_updated_at'.format(table), table_name=table)
+        op.drop_column(table, 'version')
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,44 @@
+"""search_text column with pg_trgm GIN index
+
+Revision ID: 4f2a9c1e7b3d
+Revises: d1c7acb9a872
+Create Date: 2026-10-18 19:20:41.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f2a9c1e7b3d'
+down_revision = 'd1c7acb9a872'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('search_text', sa.Text(), nullable=True))
+    op.add_column('Artist', sa.Column('search_text', sa.Text(), nullable=True))
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # same document as search.search_text(): name, city, state and genres, lower-cased
+    for table in ('Venue', 'Artist'):
+        op.execute(
+            f'UPDATE "{table}" SET search_text = '
+            f"lower(concat_ws(' ', name, city, state, array_to_string(genres, ' ')))"
+        )
+        op.create_index(
+            f'ix_{table}_search_text_trgm', table, ['search_text'],
+            postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_Artist_search_text_trgm', table_name='Artist')
+        op.drop_index('ix_Venue_search_text_trgm', table_name='Venue')
+    op.drop_column('Artist', 'search_text')
+    op.drop_column('Venue', 'search_text')
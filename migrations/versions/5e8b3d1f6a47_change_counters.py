@@ -0,0 +1,31 @@
+"""ChangeCounter table for the shows listing's validators
+
+Revision ID: 5e8b3d1f6a47
+Revises: 7a5c2e9d4b61
+Create Date: 2026-10-20 09:31:52.218406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8b3d1f6a47'
+down_revision = '7a5c2e9d4b61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ChangeCounter',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('changed_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.execute('INSERT INTO "ChangeCounter" (name, version, changed_at) VALUES (\'shows\', 1, now())')
+
+
+def downgrade():
+    op.drop_table('ChangeCounter')
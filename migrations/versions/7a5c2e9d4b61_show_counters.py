@@ -0,0 +1,45 @@
+"""upcoming_shows_count, past_shows_count and next_show_at on Venue and Artist
+
+Revision ID: 7a5c2e9d4b61
+Revises: 3d6b2f8e4a17
+Create Date: 2026-10-19 10:14:27.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a5c2e9d4b61'
+down_revision = '3d6b2f8e4a17'
+branch_labels = None
+depends_on = None
+
+# table -> its foreign key column on "Show"
+TABLES = {'Venue': 'venue_id', 'Artist': 'artist_id'}
+
+
+def upgrade():
+    for table, show_fk in TABLES.items():
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_at', sa.DateTime(), nullable=True))
+        op.create_index('ix_{}_next_show_at'.format(table), table, ['next_show_at'], unique=False)
+        # backfill from the shows already there; updated_at is left alone, the counters are derived data
+        op.execute(
+            'UPDATE "{table}" SET '
+            'upcoming_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{fk} = "{table}".id '
+            'AND "Show".start_time >= now()), '
+            'past_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{fk} = "{table}".id '
+            'AND "Show".start_time < now()), '
+            'next_show_at = (SELECT min(start_time) FROM "Show" WHERE "Show".{fk} = "{table}".id '
+            'AND "Show".start_time >= now())'.format(table=table, fk=show_fk)
+        )
+
+
+def downgrade():
+    for table in reversed(list(TABLES)):
+        op.drop_index('ix_{}_next_show_at'.format(table), table_name=table)
+        op.drop_column(table, 'next_show_at')
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
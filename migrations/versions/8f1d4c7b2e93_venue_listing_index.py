@@ -0,0 +1,25 @@
+"""index on the venues listing's keyset (state, city, -upcoming_shows_count, id)
+
+Revision ID: 8f1d4c7b2e93
+Revises: 5e8b3d1f6a47
+Create Date: 2026-10-21 11:02:44.381950
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f1d4c7b2e93'
+down_revision = '5e8b3d1f6a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_listing', 'Venue',
+                    ['state', 'city', sa.text('(-upcoming_shows_count)'), 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Venue_listing', table_name='Venue')
@@ -0,0 +1,39 @@
+"""genres as varchar[] with GIN indexes
+
+Revision ID: 9c3e5d7a1f20
+Revises: 4f2a9c1e7b3d
+Create Date: 2026-10-18 19:48:02.730511
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3e5d7a1f20'
+down_revision = '4f2a9c1e7b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    inspector = sa.inspect(op.get_bind())
+    for table in ('Venue', 'Artist'):
+        genres = next(column for column in inspector.get_columns(table) if column['name'] == 'genres')
+        # databases created before the model used ARRAY hold genres as '{"Jazz","Folk"}' text
+        if not isinstance(genres['type'], postgresql.ARRAY):
+            op.alter_column(table, 'genres', type_=postgresql.ARRAY(sa.String(length=120)),
+                            postgresql_using='genres::varchar(120)[]')
+        op.create_index(f'ix_{table}_genres', table, ['genres'], postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_Artist_genres', table_name='Artist')
+    op.drop_index('ix_Venue_genres', table_name='Venue')
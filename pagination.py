@@ -0,0 +1,85 @@
+import base64
+import binascii
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+# one page of a keyset (seek) paginated listing
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor', 'limit'])
+
+
+def encode_cursor(values, direction='next'):
+    # cursors are opaque to clients: the sort key of the boundary row plus the direction to seek in
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    payload = json.dumps({'k': values, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    # raises ValueError for anything that is not a cursor produced by encode_cursor
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values, direction = payload['k'], payload['d']
+    except (TypeError, KeyError, UnicodeError, json.JSONDecodeError, binascii.Error) as e:
+        raise ValueError('invalid cursor') from e
+    if not isinstance(values, list) or direction not in ('next', 'prev'):
+        raise ValueError('invalid cursor')
+    return values, direction
+
+
+def _coerce(column, value):
+    # turn JSON cursor values back into the column's python type
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def keyset_page(query, columns, key, cursor=None, limit=50, descending=False):
+    """Return one Page of `query` ordered by `columns`.
+
+    `columns` must form a unique sort key (end it with the primary key) and `key`
+    maps a result row to its values for those columns. Seeking with
+    `(columns) > (cursor values)` keeps deep pages O(limit) instead of O(offset).
+    """
+    values, direction = decode_cursor(cursor) if cursor else (None, 'next')
+    if values is not None and len(values) != len(columns):
+        raise ValueError('invalid cursor')
+    backwards = direction == 'prev'
+    # walking backwards through an ascending listing means scanning it in descending order
+    scan_descending = descending != backwards
+
+    if values is not None:
+        boundary = tuple_(*[_coerce(column, value) for column, value in zip(columns, values)])
+        if scan_descending:
+            query = query.filter(tuple_(*columns) < boundary)
+        else:
+            query = query.filter(tuple_(*columns) > boundary)
+
+    ordering = [column.desc() if scan_descending else column.asc() for column in columns]
+    # fetch one extra row to learn whether there is another page in this direction
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return Page([], None, None, limit)
+
+    if backwards:
+        next_cursor = encode_cursor(key(rows[-1]), 'next')
+        prev_cursor = encode_cursor(key(rows[0]), 'prev') if has_more else None
+    else:
+        next_cursor = encode_cursor(key(rows[-1]), 'next') if has_more else None
+        prev_cursor = encode_cursor(key(rows[0]), 'prev') if values is not None else None
+
+    return Page(rows, next_cursor, prev_cursor, limit)
@@ -0,0 +1,57 @@
+import threading
+import time
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+
+
+class ReplicaSet(object):
+    """Round-robin over read replica bind keys, skipping replicas marked down.
+
+    A replica that failed is left out for `retry_seconds` and then tried again.
+    """
+
+    def __init__(self, keys, retry_seconds=30, clock=time.monotonic):
+        self.keys = list(keys)
+        self.retry_seconds = retry_seconds
+        self._clock = clock
+        self._next = 0
+        self._down_until = {}
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def candidates(self):
+        """Healthy replicas to try for one request, starting with the next one in turn."""
+        now = self._clock()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.keys) if self.keys else 0
+            down_until = dict(self._down_until)
+        ordered = self.keys[start:] + self.keys[:start]
+        return [key for key in ordered if down_until.get(key, 0) <= now]
+
+    def mark_down(self, key):
+        with self._lock:
+            self._down_until[key] = self._clock() + self.retry_seconds
+
+    def status(self):
+        now = self._clock()
+        with self._lock:
+            return {key: 'down' if self._down_until.get(key, 0) > now else 'up' for key in self.keys}
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica chosen for the request (g.replica).
+
+    Flushes and everything outside a replica-routed request use the primary, as
+    does any statement given an explicit bind.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context():
+            replica = g.get('replica')
+            if replica is not None:
+                return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,108 @@
+import re
+from collections import Counter, defaultdict
+
+# pg_trgm's default word_similarity_threshold, so both backends agree on what counts as a fuzzy match
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+_WORD = re.compile(r'\w+')
+
+
+def search_text(*parts, genres=None):
+    # the lower-cased document searched for a venue or artist: name, city, state and genres
+    values = [part for part in parts if part]
+    values.extend(genre for genre in (genres or []) if genre)
+    return ' '.join(values).lower()
+
+
+def contains_pattern(term, escape='\\'):
+    # ILIKE pattern matching `term` anywhere, with its own %, _ and escape characters taken literally
+    for special in (escape, '%', '_'):
+        term = term.replace(special, escape + special)
+    return '%' + term + '%'
+
+
+def trigrams(text):
+    # pg_trgm style trigrams: each word is lower-cased and padded with two spaces in front, one behind
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = '  ' + word + ' '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _inner_trigrams(term):
+    # unpadded trigrams every document containing `term` as a substring must also contain
+    grams = set()
+    for word in _WORD.findall(term):
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+class TrigramIndex(object):
+    """In-process trigram inverted index.
+
+    Stand-in for the pg_trgm GIN index on databases without it (SQLite in tests):
+    a document matches when it contains the term as a substring or when its
+    word similarity to the term reaches WORD_SIMILARITY_THRESHOLD.
+    """
+
+    def __init__(self, documents=()):
+        self._texts = {}
+        self._postings = defaultdict(set)
+        for doc_id, text in documents:
+            self.add(doc_id, text)
+
+    def __len__(self):
+        return len(self._texts)
+
+    def add(self, doc_id, text):
+        self.remove(doc_id)
+        text = (text or '').lower()
+        self._texts[doc_id] = text
+        for gram in trigrams(text):
+            self._postings[gram].add(doc_id)
+
+    def remove(self, doc_id):
+        text = self._texts.pop(doc_id, None)
+        if text is None:
+            return
+        for gram in trigrams(text):
+            postings = self._postings[gram]
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[gram]
+
+    def search(self, term):
+        """Return [(doc_id, score)] for documents matching `term`, best match first."""
+        term = (term or '').strip().lower()
+        if not term:
+            return sorted(((doc_id, 0.0) for doc_id in self._texts), key=self._tie_break)
+
+        term_grams = trigrams(term)
+        # how many of the term's trigrams each candidate document shares
+        overlap = Counter()
+        for gram in term_grams:
+            overlap.update(self._postings.get(gram, ()))
+        scores = {}
+        for doc_id, shared in overlap.items():
+            score = shared / len(term_grams)
+            if score >= WORD_SIMILARITY_THRESHOLD:
+                scores[doc_id] = score
+
+        # substring matches: narrow the candidates with the term's inner trigrams when it has any
+        inner = _inner_trigrams(term)
+        if inner:
+            candidates = set.intersection(*[self._postings.get(gram, set()) for gram in inner])
+        else:
+            candidates = self._texts.keys()
+        # a plain substring test: %, _ and backslashes in the term are literal, as in the escaped ILIKE on Postgres;
+        # a term without a single word character (e.g. "%") has no trigrams and scores 0
+        for doc_id in candidates:
+            if term in self._texts[doc_id]:
+                score = overlap[doc_id] / len(term_grams) if term_grams else 0.0
+                scores[doc_id] = max(scores.get(doc_id, 0.0), score)
+
+        return sorted(scores.items(), key=lambda item: (-item[1],) + self._tie_break(item))
+
+    def _tie_break(self, item):
+        return self._texts[item[0]], item[0]
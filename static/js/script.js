@@ -2,3 +2,19 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// "Load more" on venue and artist pages: replace the link with the next page of show tiles
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('.load-more a');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  var wrapper = link.parentNode;
+  fetch(link.href).then(function (response) {
+    return response.text();
+  }).then(function (html) {
+    wrapper.insertAdjacentHTML('afterend', html);
+    wrapper.remove();
+  });
+});
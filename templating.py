@@ -0,0 +1,115 @@
+import bisect
+import threading
+import time
+
+from flask import before_render_template, g, template_rendered
+from jinja2 import FileSystemBytecodeCache
+
+from instrumentation import current_query_stats
+
+# upper bounds (ms) of the render time histogram buckets; the last bucket is everything slower
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class Histogram(object):
+    """Render times of one template, in BUCKETS_MS buckets."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def as_dict(self):
+        # cumulative, like Prometheus buckets: renders that took at most `le` ms
+        buckets, seen = [], 0
+        for bound, count in zip(BUCKETS_MS + ('+Inf',), self.counts):
+            seen += count
+            buckets.append({'le': bound, 'count': seen})
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else 0,
+            'max_ms': round(self.max_ms, 3),
+            'buckets': buckets,
+        }
+
+
+class TemplateInstrumentation(object):
+    """Jinja bytecode cache, template precompilation and per-template render time histograms.
+
+    The bytecode cache (TEMPLATE_BYTECODE_CACHE, in TEMPLATE_CACHE_DIR or a
+    per-user temp directory) is shared by every worker on the host, so only the
+    first process to load a changed template compiles it. Render times exclude
+    the SQL run while rendering, so a slow template is told apart from a
+    template that triggers slow queries; the request's total is added to
+    Server-Timing as "tpl". Streamed templates are timed until their last chunk
+    (which includes waiting on the client) and are not in Server-Timing.
+    """
+
+    def __init__(self, app=None):
+        self.histograms = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        if app.config.get('TEMPLATE_BYTECODE_CACHE', True):
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config.get('TEMPLATE_CACHE_DIR'))
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._rendered, app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def precompile(self):
+        """Compile (or load from the bytecode cache) every template now rather than on its first request.
+
+        Call it once every filter and global is registered: Jinja checks filter names at compile time.
+        """
+        env = self.app.jinja_env
+        names = env.list_templates(filter_func=lambda name: name.endswith('.html'))
+        for name in names:
+            env.get_template(name)
+        return names
+
+    def _start_request(self):
+        g.template_timers = []
+        g.pop('template_ms', None)
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = current_query_stats()
+        g.setdefault('template_timers', []).append((time.perf_counter(), stats.seconds if stats else 0.0))
+
+    def _rendered(self, sender, template, context, **extra):
+        timers = g.get('template_timers')
+        if not timers:
+            return
+        started, db_started = timers.pop()
+        stats = current_query_stats()
+        db_seconds = stats.seconds - db_started if stats is not None else 0.0
+        ms = max(time.perf_counter() - started - db_seconds, 0) * 1000
+        g.template_ms = g.get('template_ms', 0.0) + ms
+        name = template.name or '<string>'
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    def _finish_request(self, response):
+        # a streamed template is still rendering here: its timer stays on g until the last chunk
+        ms = g.pop('template_ms', None)
+        if ms is not None:
+            response.headers.add('Server-Timing', 'tpl;dur={:.2f}'.format(ms))
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {name: histogram.as_dict() for name, histogram in sorted(self.histograms.items())}
@@ -0,0 +1,57 @@
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from itertools import count
+
+import pytest
+
+# the app connects as it is imported: point it at a throwaway SQLite database first
+DATABASE_DIR = tempfile.mkdtemp(prefix='fyyur-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DATABASE_DIR, 'fyyur.db')
+os.environ.pop('DATABASE_REPLICA_URLS', None)
+os.environ['CACHE_TYPE'] = 'null'
+os.environ['SQL_STRICT'] = 'true'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as fyyur  # noqa: E402
+
+
+def pytest_sessionfinish(session, exitstatus):
+    with fyyur.app.app_context():
+        fyyur.db.engine.dispose()
+    shutil.rmtree(DATABASE_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def app():
+    fyyur.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with fyyur.app.app_context():
+        fyyur.db.drop_all(bind_key=None)
+        fyyur.db.create_all(bind_key=None)
+        yield fyyur.app
+        fyyur.db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_shows(app):
+    """make_shows(n): n more upcoming shows, each with its own venue and artist."""
+    numbers = count()
+
+    def make(number):
+        db = fyyur.db
+        for index in [next(numbers) for _ in range(number)]:
+            venue = fyyur.Venue(name='Venue {}'.format(index), city='San Francisco', state='CA',
+                                address='{} Main Street'.format(index), genres=['Jazz'])
+            artist = fyyur.Artist(name='Artist {}'.format(index), city='San Francisco', state='CA',
+                                  genres=['Jazz'], image_link='https://example.com/{}.jpg'.format(index))
+            db.session.add(fyyur.Show(venue=venue, artist=artist,
+                                      start_time=datetime.now() + timedelta(days=index + 1)))
+        db.session.commit()
+    return make
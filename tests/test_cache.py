@@ -0,0 +1,71 @@
+import fnmatch
+import time
+
+from cache import RedisCache, TaggedCache
+
+
+class FakeRedis(object):
+    """The few redis-py calls RedisCache makes, over a dict: values are bytes, px expires keys."""
+
+    def __init__(self):
+        self.data = {}
+
+    def _live(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            return None
+        return value
+
+    def mget(self, keys):
+        return [self._live(key) for key in keys]
+
+    def set(self, key, value, px=None):
+        assert isinstance(value, bytes)
+        self.data[key] = (value, None if px is None else time.monotonic() + px / 1000)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if fnmatch.fnmatchcase(key, match)]
+
+
+def test_redis_backend_round_trip_and_expiry():
+    client = FakeRedis()
+    cache = RedisCache(client, prefix='test:', default_timeout=300)
+    cache.set('page', {'html': '<p>venues</p>'})
+    cache.set('short', 'gone soon', timeout=0.01)
+    cache.set('forever', 'kept', timeout=0)
+    assert cache.get('page') == {'html': '<p>venues</p>'}
+    assert cache.get_many(['page', 'missing']) == [{'html': '<p>venues</p>'}, None]
+    assert client.data['test:forever'][1] is None
+    time.sleep(0.02)
+    assert cache.get('short') is None
+    cache.delete('page')
+    assert cache.get('page') is None
+
+
+def test_redis_backend_clear_keeps_other_prefixes():
+    client = FakeRedis()
+    client.set('other:key', b'x')
+    cache = RedisCache(client, prefix='test:')
+    cache.set('page', 'value')
+    cache.clear()
+    assert cache.get('page') is None
+    assert client.mget(['other:key']) == [b'x']
+
+
+def test_invalidation_reaches_every_worker_sharing_redis():
+    client = FakeRedis()
+    # two workers: separate TaggedCache and RedisCache objects over one Redis
+    first, second = (TaggedCache(RedisCache(client, prefix='test:')) for _ in range(2))
+    entry_key, value = first.lookup('/venues', tags=['venues'])
+    assert value is None
+    first.store(entry_key, 'listing')
+    assert second.lookup('/venues', tags=['venues']) == (entry_key, 'listing')
+
+    second.invalidate('venues')
+    assert first.lookup('/venues', tags=['venues'])[1] is None
+    assert first.invalidated_at(first.lookup('/venues', tags=['venues'])[0]) > 0
+    assert first.stats()['backend'] == 'RedisCache'
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+import app as fyyur
+
+VENUE_COLUMNS = 'name,city,state,address,genres,website,facebook_link\n'
+
+
+def venue_line(name, state='CA', genres='Jazz, Folk'):
+    return '{},San Francisco,{},1 Main Street,"{}",https://example.com,https://facebook.com/x\n'.format(
+        name, state, genres)
+
+
+def post_rows(client, kind, body, content_type):
+    response = client.post('/api/v1/{}:bulk'.format(kind), data=body, content_type=content_type)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def names(model):
+    return sorted(name for name, in fyyur.db.session.query(model.name))
+
+
+@pytest.fixture
+def small_batches(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMPORT_BATCH_SIZE', 2)
+
+
+def test_csv_import_reports_invalid_rows_and_inserts_the_rest(client):
+    body = VENUE_COLUMNS + venue_line('Good One') + venue_line('', state='XX') + venue_line('Good Two', genres='')
+    report = post_rows(client, 'venues', body, 'text/csv')
+
+    assert report['inserted'] == 1
+    assert [error['row'] for error in report['errors']] == [2, 3]
+    assert set(report['errors'][0]['errors']) == {'name', 'state'}
+    assert set(report['errors'][1]['errors']) == {'genres'}
+    venue = fyyur.Venue.query.one()
+    assert (venue.name, venue.genres) == ('Good One', ['Jazz', 'Folk'])
+
+
+def test_ndjson_show_rows_name_their_venue_and_artist_or_give_ids(client, make_shows):
+    make_shows(2)
+    rows = [
+        {'venue_id': 'Venue 0', 'artist_id': 'Artist 1', 'start_time': '2030-01-01T20:00:00'},
+        {'venue_id': 2, 'artist': 'Artist 0', 'start_time': '2030-01-02 20:00:00'},
+        {'venue': 'Nowhere', 'artist_id': 99, 'start_time': '2030-01-03T20:00:00'},
+        ['not', 'an', 'object'],
+        '{broken',
+    ]
+    body = '\n'.join(row if isinstance(row, str) else json.dumps(row) for row in rows) + '\n'
+    report = post_rows(client, 'shows', body, 'application/x-ndjson')
+
+    assert report['inserted'] == 2
+    assert [(error['row'], sorted(error['errors'])) for error in report['errors']] == [
+        (3, ['artist_id', 'venue_id']), (4, ['row']), (5, ['row'])]
+    assert report['errors'][0]['errors']['venue_id'] == ['venue Nowhere does not exist']
+    assert report['errors'][2]['errors']['row'][0].startswith('invalid JSON')
+    shows = fyyur.Show.query.filter(fyyur.Show.id > 2).order_by(fyyur.Show.id).all()
+    assert [(show.venue_id, show.artist_id) for show in shows] == [(1, 2), (2, 1)]
+    assert fyyur.db.session.get(fyyur.Venue, 1).upcoming_shows_count == 2
+
+
+def test_ambiguous_names_must_be_given_as_ids(client, make_shows):
+    make_shows(1)
+    fyyur.db.session.add(fyyur.Venue(name='Venue 0', city='Oakland', state='CA', genres=['Jazz']))
+    fyyur.db.session.commit()
+
+    rows = [{'venue': 'Venue 0', 'artist': 'Artist 0', 'start_time': '2030-01-01 20:00:00'},
+            {'venue': '2', 'artist': 'Artist 0', 'start_time': '2030-01-01 20:00:00'}]
+    report = post_rows(client, 'shows', json.dumps(rows), 'application/json')
+
+    assert report['inserted'] == 1
+    assert report['errors'] == [{'row': 1, 'errors': {'venue_id': ['venue Venue 0 is ambiguous, use the id']}}]
+    assert fyyur.db.session.get(fyyur.Venue, 2).upcoming_shows_count == 1
+
+
+def test_a_rejected_batch_is_reported_and_the_others_still_go_in(client, small_batches):
+    # a database-side rule standing in for any constraint the form cannot check
+    fyyur.db.session.execute(fyyur.db.text(
+        'CREATE TRIGGER reject_venue BEFORE INSERT ON "Venue" WHEN NEW.name = \'Rejected\' '
+        "BEGIN SELECT RAISE(ABORT, 'rejected by the database'); END"))
+    fyyur.db.session.commit()
+
+    body = VENUE_COLUMNS + ''.join(venue_line(name) for name in ('A', 'B', 'C', 'Rejected', 'E'))
+    report = post_rows(client, 'venues', body, 'text/csv')
+
+    assert report['inserted'] == 3
+    [error] = report['errors']
+    assert (error['row'], error['last_row']) == (3, 4)
+    assert 'rejected by the database' in error['errors']['batch'][0]
+    assert names(fyyur.Venue) == ['A', 'B', 'E']
+
+
+def test_rows_before_an_unreadable_part_of_the_stream_are_imported(client):
+    # rows long enough that the first ones are decoded (and imported) before the reader reaches the bad bytes
+    description = 'x' * 4000
+    lines = ['Venue {},San Francisco,CA,1 Main Street,Jazz,https://example.com,https://facebook.com/x,{}\n'.format(
+        number, description) for number in range(3)]
+    body = (VENUE_COLUMNS.replace('\n', ',seeking_description\n') + ''.join(lines)).encode() + b'Caf\xe9,Oakland\n'
+    report = post_rows(client, 'venues', body, 'text/csv')
+
+    [error] = report['errors']
+    assert 0 < report['inserted'] < 3
+    assert error['row'] == report['inserted'] + 1
+    assert error['errors']['file'][0].startswith('could not read past row {}:'.format(report['inserted']))
+    assert len(names(fyyur.Venue)) == report['inserted']
+
+
+def test_unsupported_bodies_are_refused(client):
+    assert client.post('/api/v1/venues:bulk', data='x', content_type='text/plain').status_code == 415
+    assert client.post('/api/v1/venues:bulk', data='{}', content_type='application/json').status_code == 400
+    assert client.post('/api/v1/stages:bulk', data='', content_type='text/csv').status_code == 404
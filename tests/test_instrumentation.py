@@ -0,0 +1,40 @@
+import pytest
+
+from instrumentation import QueryBudgetExceeded, QueryStats, fingerprint
+
+
+def test_fingerprint_collapses_parameters_literals_and_in_lists():
+    assert fingerprint('SELECT * FROM "Show"\n WHERE venue_id = ? AND id IN (?, ?, ?)') == \
+        'SELECT * FROM "Show" WHERE venue_id = ? AND id IN (?)'
+    assert fingerprint("SELECT name FROM \"Venue\" WHERE id = 12 AND city = 'Denver'") == \
+        fingerprint("SELECT name FROM \"Venue\" WHERE id = 7 AND city = 'Austin'")
+
+
+def test_repeated_statements_are_reported_by_shape():
+    stats = QueryStats()
+    for venue_id in range(5):
+        stats.record('SELECT * FROM "Show" WHERE venue_id = {}'.format(venue_id), 0.001)
+    stats.record('SELECT count(*) FROM "Venue"', 0.001)
+    assert stats.count == 6
+    assert stats.repeated(3) == [('SELECT * FROM "Show" WHERE venue_id = ?', 5)]
+
+
+def test_strict_mode_fails_a_request_over_its_query_budget(app, client, make_shows, monkeypatch):
+    make_shows(1)
+    monkeypatch.setitem(app.config, 'SQL_QUERY_BUDGET', 0)
+    with pytest.raises(QueryBudgetExceeded, match=r'shows ran \d+ queries, budget 0'):
+        client.get('/shows')
+
+
+def test_strict_mode_fails_a_request_repeating_a_statement(app, client, make_shows, monkeypatch):
+    make_shows(1)
+    monkeypatch.setitem(app.config, 'SQL_MAX_REPEATS', 0)
+    with pytest.raises(QueryBudgetExceeded, match='ran the same statement 1 times'):
+        client.get('/shows')
+
+
+def test_without_strict_mode_an_over_budget_request_succeeds(app, client, make_shows, monkeypatch):
+    make_shows(1)
+    monkeypatch.setitem(app.config, 'SQL_STRICT', False)
+    monkeypatch.setitem(app.config, 'SQL_QUERY_BUDGET', 0)
+    assert client.get('/shows').status_code == 200
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine
+
+import app as fyyur
+from replicas import ReplicaSet
+
+
+def replica(path, venue_name=None):
+    # a SQLite file standing in for a replica, holding one venue when given its name
+    engine = create_engine('sqlite:///' + path)
+    if venue_name is not None:
+        fyyur.db.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(fyyur.Venue.__table__.insert().values(
+                id=1, name=venue_name, city='Denver', state='CO', genres=['Jazz']))
+    return engine
+
+
+@pytest.fixture
+def replicas(app, monkeypatch, tmp_path):
+    """replicas(name or None, ...): SQLite replicas serving venue 1 under that name (None: unreachable)."""
+    def configure(*venue_names):
+        keys = ['replica_{}'.format(number) for number in range(len(venue_names))]
+        for key, venue_name in zip(keys, venue_names):
+            path = str(tmp_path / (key + '.db')) if venue_name else os.path.join(str(tmp_path), 'missing', 'x.db')
+            monkeypatch.setitem(fyyur.db.engines, key, replica(path, venue_name))
+        replica_set = ReplicaSet(keys, retry_seconds=60)
+        monkeypatch.setattr(fyyur, 'replica_set', replica_set)
+        return replica_set
+    return configure
+
+
+def venue_name(client):
+    response = client.get('/api/v1/venues/1?fields=name')
+    assert response.status_code == 200
+    return response.get_json()['data']['name']
+
+
+def test_reads_take_the_replicas_in_turn(client, make_shows, replicas):
+    make_shows(1)
+    replicas('First', 'Second')
+    assert [venue_name(client) for _ in range(4)] == ['First', 'Second', 'First', 'Second']
+
+
+def test_a_failed_replica_is_marked_down_and_skipped(client, make_shows, replicas):
+    make_shows(1)
+    replica_set = replicas(None, 'Second')
+    assert venue_name(client) == 'Second'
+    assert replica_set.status() == {'replica_0': 'down', 'replica_1': 'up'}
+    assert [venue_name(client) for _ in range(2)] == ['Second', 'Second']
+
+
+def test_every_replica_down_falls_back_to_the_primary(client, make_shows, replicas):
+    make_shows(1)
+    replicas(None)
+    assert venue_name(client) == 'Venue 0'
+
+
+def test_a_client_reads_its_own_writes_from_the_primary(client, make_shows, replicas):
+    make_shows(1)
+    replicas('Replica')
+    assert venue_name(client) == 'Replica'
+    response = client.post('/venues/1/edit', data={'name': 'Renamed', 'city': 'Denver', 'state': 'CO',
+                                                   'address': '1 Main Street', 'phone': '400-555-0100',
+                                                   'genres': ['Jazz']})
+    assert response.status_code == 302
+    assert venue_name(client) == 'Renamed'
+    # another client, without the sticky session, still reads the (lagging) replica
+    assert venue_name(fyyur.app.test_client()) == 'Replica'
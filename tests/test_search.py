@@ -0,0 +1,20 @@
+from search import TrigramIndex, contains_pattern
+
+
+def test_contains_pattern_escapes_like_wildcards():
+    assert contains_pattern('jazz') == '%jazz%'
+    assert contains_pattern('100%_off\\') == '%100\\%\\_off\\\\%'
+
+
+def test_wildcard_characters_match_literally():
+    index = TrigramIndex([(1, 'the musical hop'), (2, 'dueling_pianos bar'), (3, '100% jazz club')])
+    assert [doc_id for doc_id, score in index.search('_')] == [2]
+    assert [doc_id for doc_id, score in index.search('%')] == [3]
+    assert index.search('\\') == []
+
+
+def test_search_page_treats_underscore_literally(client, make_shows):
+    make_shows(3)
+    response = client.post('/venues/search', data={'search_term': '_'})
+    assert response.status_code == 200
+    assert 'Venue 0' not in response.get_data(as_text=True)
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as fyyur
+
+NOW = datetime(2030, 6, 1, 12, 0)
+
+
+class Clock(object):
+    # stands in for app.datetime: now() is whatever the test set
+    now_value = NOW
+
+    @classmethod
+    def now(cls):
+        return cls.now_value
+
+
+@pytest.fixture
+def clock(app, monkeypatch):
+    Clock.now_value = NOW
+    monkeypatch.setattr(fyyur, 'datetime', Clock)
+    return Clock
+
+
+@pytest.fixture
+def venue_and_artist(app):
+    db = fyyur.db
+    venue = fyyur.Venue(name='The Hall', city='Denver', state='CO', genres=['Jazz'])
+    artist = fyyur.Artist(name='The Band', city='Denver', state='CO', genres=['Jazz'])
+    db.session.add_all([venue, artist])
+    db.session.commit()
+    return venue.id, artist.id
+
+
+def counters(model, entity_id):
+    fyyur.db.session.expire_all()
+    entity = fyyur.db.session.get(model, entity_id)
+    return entity.upcoming_shows_count, entity.past_shows_count, entity.next_show_at
+
+
+def add_show(venue_id, artist_id, start_time):
+    show = fyyur.Show(venue_id=venue_id, artist_id=artist_id, start_time=start_time)
+    fyyur.db.session.add(show)
+    fyyur.db.session.commit()
+    return show
+
+
+def test_inserting_upcoming_and_past_shows(clock, venue_and_artist):
+    venue_id, artist_id = venue_and_artist
+    add_show(venue_id, artist_id, NOW + timedelta(days=2))
+    add_show(venue_id, artist_id, NOW + timedelta(days=1))
+    add_show(venue_id, artist_id, NOW - timedelta(days=1))
+    assert counters(fyyur.Venue, venue_id) == (2, 1, NOW + timedelta(days=1))
+    assert counters(fyyur.Artist, artist_id) == (2, 1, NOW + timedelta(days=1))
+
+
+def test_deleting_and_moving_shows_recount(clock, venue_and_artist):
+    venue_id, artist_id = venue_and_artist
+    other_venue = fyyur.Venue(name='The Other Hall', city='Denver', state='CO', genres=['Jazz'])
+    fyyur.db.session.add(other_venue)
+    soon = add_show(venue_id, artist_id, NOW + timedelta(days=1))
+    later = add_show(venue_id, artist_id, NOW + timedelta(days=5))
+
+    fyyur.db.session.delete(soon)
+    fyyur.db.session.commit()
+    assert counters(fyyur.Venue, venue_id) == (1, 0, NOW + timedelta(days=5))
+
+    # to another venue and into the past: both venues and the artist are recounted
+    later.venue_id = other_venue.id
+    later.start_time = NOW - timedelta(days=3)
+    fyyur.db.session.commit()
+    assert counters(fyyur.Venue, venue_id) == (0, 0, None)
+    assert counters(fyyur.Venue, other_venue.id) == (0, 1, None)
+    assert counters(fyyur.Artist, artist_id) == (0, 1, None)
+
+
+def test_bulk_insert_recounts_venues_and_artists(clock, venue_and_artist):
+    venue_id, artist_id = venue_and_artist
+    rows = [{'venue_id': venue_id, 'artist_id': artist_id, 'start_time': NOW + timedelta(days=days)}
+            for days in (-2, 3, 7)]
+    assert fyyur.bulk_insert(fyyur.Show, rows, batch_size=2) == 3
+    assert counters(fyyur.Venue, venue_id) == (2, 1, NOW + timedelta(days=3))
+    assert counters(fyyur.Artist, artist_id) == (2, 1, NOW + timedelta(days=3))
+
+
+def test_rollover_moves_started_shows_to_past(clock, venue_and_artist):
+    venue_id, artist_id = venue_and_artist
+    add_show(venue_id, artist_id, NOW + timedelta(hours=1))
+    add_show(venue_id, artist_id, NOW + timedelta(days=1))
+
+    clock.now_value = NOW + timedelta(hours=2)
+    # stale until the rollover runs: the first show has started
+    assert counters(fyyur.Venue, venue_id) == (2, 0, NOW + timedelta(hours=1))
+    assert fyyur.rollover_show_counters() == {fyyur.Venue: 1, fyyur.Artist: 1}
+    assert counters(fyyur.Venue, venue_id) == (1, 1, NOW + timedelta(days=1))
+    assert counters(fyyur.Artist, artist_id) == (1, 1, NOW + timedelta(days=1))
+    # nothing else has started: the next rollover has nothing to do
+    assert fyyur.rollover_show_counters() == {fyyur.Venue: 0, fyyur.Artist: 0}
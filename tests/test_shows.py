@@ -0,0 +1,22 @@
+import re
+
+QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def statements(response):
+    # the SQL statement count SQLInstrumentation puts in Server-Timing
+    return int(QUERIES.search(', '.join(response.headers.get_all('Server-Timing'))).group(1))
+
+
+def test_shows_page_runs_the_same_queries_for_1_and_50_shows(client, make_shows):
+    # strict mode (conftest) also fails the request if any statement is repeated per show
+    make_shows(1)
+    response = client.get('/shows')
+    assert response.status_code == 200
+    one = statements(response)
+
+    make_shows(49)
+    response = client.get('/shows')
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).count('Venue 49') == 1
+    assert statements(response) == one
@@ -0,0 +1,55 @@
+import app as fyyur
+
+VENUE_FORM = {'name': 'Venue 0', 'city': 'Denver', 'state': 'CO', 'address': '0 Main Street',
+              'phone': '400-555-0100', 'genres': ['Jazz'], 'seeking_description': 'Edited'}
+
+
+def revalidate(client, url):
+    first = client.get(url)
+    assert first.status_code == 200 and first.headers['ETag']
+    again = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    return first, again
+
+
+def test_unchanged_pages_answer_304(client, make_shows):
+    make_shows(2)
+    for url in ('/shows', '/venues/1', '/artists/1'):
+        first, again = revalidate(client, url)
+        assert again.status_code == 304, url
+        assert again.get_data() == b''
+        since = client.get(url, headers={'If-Modified-Since': first.headers['Last-Modified']})
+        assert since.status_code == 304, url
+
+
+def test_a_new_show_changes_its_pages_validators(client, make_shows):
+    make_shows(2)
+    before = {url: client.get(url).headers['ETag'] for url in ('/shows', '/venues/1', '/artists/2', '/venues/2')}
+    response = client.post('/shows/create', data={'venue_id': 1, 'artist_id': 2, 'start_time': '2035-01-01 20:00:00'})
+    assert response.status_code == 200
+    for url in ('/shows', '/venues/1', '/artists/2'):
+        assert client.get(url, headers={'If-None-Match': before[url]}).status_code == 200, url
+    assert client.get('/venues/2', headers={'If-None-Match': before['/venues/2']}).status_code == 304
+
+
+def test_deleting_a_show_changes_the_shows_validators(client, make_shows):
+    make_shows(2)
+    etag = client.get('/shows').headers['ETag']
+    fyyur.db.session.delete(fyyur.db.session.get(fyyur.Show, 1))
+    fyyur.db.session.commit()
+    assert client.get('/shows', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_an_edit_survives_a_version_bump_from_the_show_events(client, make_shows):
+    make_shows(1)
+    db = fyyur.db
+    venue = db.session.get(fyyur.Venue, 1)
+    version = venue.version
+    # what count_new_show does to the row between the edit loading it and committing
+    db.session.connection().execute(fyyur.Venue.__table__.update().values(**fyyur.touched(fyyur.Venue.__table__)))
+    venue.seeking_description = 'Edited'
+    db.session.commit()
+    assert db.session.get(fyyur.Venue, 1).version == version + 2
+
+    response = client.post('/venues/1/edit', data=VENUE_FORM)
+    assert response.status_code == 302
+    assert db.session.get(fyyur.Venue, 1).city == 'Denver'
@@ -0,0 +1,42 @@
+import re
+import threading
+from datetime import datetime, timedelta
+
+import app as fyyur
+
+NEXT = re.compile(r'<li class="next"><a href="([^"]+)"')
+VENUE = re.compile(r'<a href="/venues/(\d+)">')
+
+
+def test_venues_listing_pages_venues_not_areas(client, make_shows):
+    make_shows(5)
+    # one more upcoming show for venue 5: it lists first in its city
+    fyyur.db.session.add(fyyur.Show(venue_id=5, artist_id=1, start_time=datetime.now() + timedelta(days=30)))
+    fyyur.db.session.commit()
+
+    seen, url = [], '/venues?limit=2'
+    while url:
+        html = client.get(url).get_data(as_text=True)
+        ids = [int(venue_id) for venue_id in VENUE.findall(html)]
+        assert len(ids) <= 2
+        seen.extend(ids)
+        found = NEXT.search(html)
+        url = found.group(1).replace('&amp;', '&') if found else None
+    assert seen == [5, 1, 2, 3, 4]
+
+
+def test_detail_queries_run_in_turn_when_the_pool_is_full(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'DETAIL_QUERY_WORKERS', 2)
+    thread_name = lambda: threading.current_thread().name
+    engine = fyyur.db.engine
+    with app.test_request_context('/venues/1'):
+        assert fyyur.concurrently(thread_name, thread_name)[1].startswith('query')
+
+        # other requests hold every connection but the one this request needs for itself
+        held = [engine.connect() for _ in range(fyyur.free_connections(engine) - 1)]
+        try:
+            assert fyyur.free_connections(engine) == 1
+            assert fyyur.concurrently(thread_name, thread_name) == [thread_name()] * 2
+        finally:
+            for connection in held:
+                connection.close()